@@ -0,0 +1,166 @@
+"""
+In-memory rate limits for the HTTP API.
+
+Every request spends from its token's general bucket. POST /account (OTP)
+additionally spends from the token's OTP bucket and from the channel's OTP
+bucket, since every app of a channel shares one Beanfun session. An app's
+OTP limit can be overridden per token (TokenRecord.otp_rate_per_min /
+otp_burst); everything else comes from the configuration.
+"""
+
+from collections import OrderedDict
+from typing import Hashable, List, Sequence, Tuple
+
+from database.token_db import TokenRecord
+from utils.config import (
+    API_CHANNEL_OTP_BURST,
+    API_CHANNEL_OTP_PER_MIN,
+    API_OTP_BURST,
+    API_OTP_PER_MIN,
+    API_RATE_BURST,
+    API_RATE_PER_SEC,
+)
+from utils.rate_limit import TokenBucket
+
+# (key, tokens per second, capacity)
+Limit = Tuple[Hashable, float, float]
+
+
+class KeyedRateLimiter:
+    """
+    One TokenBucket per key, created on first use. The least recently used
+    buckets are dropped once more than `max_keys` exist; a dropped bucket
+    simply starts full again.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self._max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: Hashable, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            # The limit of an app may have been changed since the bucket was made.
+            bucket.rate = rate
+            bucket.capacity = capacity
+        return bucket
+
+    def acquire(self, limits: Sequence[Limit], cost: float = 1.0) -> float:
+        """
+        Take `cost` from every bucket in `limits`, or from none of them.
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until all buckets could allow it.
+        """
+        buckets = [self._bucket(key, rate, cap) for key, rate, cap in limits]
+        wait = max((b.time_until(cost) for b in buckets), default=0.0)
+        if wait > 0:
+            return wait
+        for bucket in buckets:
+            bucket.try_take(cost)
+        return 0.0
+
+    def acquire_up_to(self, limits: Sequence[Limit], count: int) -> Tuple[int, float]:
+        """
+        Take as many whole units as every bucket in `limits` allows, at most `count`.
+
+        Returns:
+            Tuple[int, float]: Units taken, and seconds until one more would be
+                allowed (0 if all `count` were taken).
+        """
+        buckets = [self._bucket(key, rate, cap) for key, rate, cap in limits]
+        granted = min([count] + [int(b.tokens()) for b in buckets])
+        if granted > 0:
+            for bucket in buckets:
+                bucket.try_take(granted)
+        if granted >= count:
+            return count, 0.0
+        return granted, max(b.time_until(1) for b in buckets)
+
+
+class ApiRateLimiter:
+    """The API's request and OTP limits on top of one KeyedRateLimiter."""
+
+    def __init__(
+        self,
+        rate_per_sec: float = API_RATE_PER_SEC,
+        burst: float = API_RATE_BURST,
+        otp_per_min: float = API_OTP_PER_MIN,
+        otp_burst: float = API_OTP_BURST,
+        channel_otp_per_min: float = API_CHANNEL_OTP_PER_MIN,
+        channel_otp_burst: float = API_CHANNEL_OTP_BURST,
+        max_keys: int = 10000,
+    ):
+        self._rate_per_sec = rate_per_sec
+        self._burst = burst
+        self._otp_per_min = otp_per_min
+        self._otp_burst = otp_burst
+        self._channel_otp_per_min = channel_otp_per_min
+        self._channel_otp_burst = channel_otp_burst
+        self._limiter = KeyedRateLimiter(max_keys)
+        self.limited = 0
+
+    def _acquire(self, limits: Sequence[Limit]) -> float:
+        wait = self._limiter.acquire(limits)
+        if wait > 0:
+            self.limited += 1
+        return wait
+
+    def check_request(self, record: TokenRecord) -> float:
+        """Spend one request of the token's general limit. Returns the wait, if any."""
+        return self._acquire(
+            [(("request", record.id), self._rate_per_sec, self._burst)]
+        )
+
+    def otp_limit(self, record: TokenRecord) -> Tuple[float, float]:
+        """The (per minute, burst) OTP limit that applies to an app."""
+        per_min = record.otp_rate_per_min
+        burst = record.otp_burst
+        return (
+            self._otp_per_min if per_min is None else per_min,
+            self._otp_burst if burst is None else burst,
+        )
+
+    def _otp_limits(self, record: TokenRecord) -> List[Limit]:
+        per_min, burst = self.otp_limit(record)
+        return [
+            (("otp", record.id), per_min / 60, burst),
+            (
+                ("channel_otp", record.channel_id),
+                self._channel_otp_per_min / 60,
+                self._channel_otp_burst,
+            ),
+        ]
+
+    def check_otp(self, record: TokenRecord) -> float:
+        """Spend one OTP of the token's and the channel's limits. Returns the wait."""
+        return self._acquire(self._otp_limits(record))
+
+    def check_otps(self, record: TokenRecord, count: int) -> Tuple[int, float]:
+        """
+        Spend up to `count` OTPs of the token's and the channel's limits.
+
+        Returns:
+            Tuple[int, float]: How many OTPs may be fetched now, and the wait
+                before the next one if that is fewer than `count`.
+        """
+        granted, wait = self._limiter.acquire_up_to(self._otp_limits(record), count)
+        if granted < count:
+            self.limited += 1
+        return granted, wait
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._limiter), "limited": self.limited}
+
+
+def retry_after_header(wait: float) -> str:
+    """Retry-After value in whole seconds, never 0."""
+    return str(max(1, int(wait + 0.999)))
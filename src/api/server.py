@@ -4,16 +4,30 @@ HTTP API Server — independent of Discord cogs.
 Shares state with the bot only through:
   - bot.login_dict   (Dict[channel_id, BeanfunLogin])
   - bot.token_db     (TokenDatabase)
-  - bot.get_channel() (for Discord notifications)
+  - bot.audit_log    (AuditLog, optional)
+  - bot.notifier     (NotificationDispatcher, optional)
+  - bot.get_channel() (for Discord notifications without a notifier)
+  - utils.event_bus   (session events published by BeanfunLogin)
 """
 
+import asyncio
 import json
 import logging
+from collections import Counter
 from typing import Optional
 
 from aiohttp import web
 
+from api.rate_limit import ApiRateLimiter, retry_after_header
+from database.audit_log import AuditEvent, AuditLog
 from database.token_db import TokenDatabase, TokenRecord
+from exceptions.beanfun_error import BeanfunUnavailableError
+from utils.config import (
+    API_BATCH_MAX_ACCOUNTS,
+    SSE_KEEPALIVE_SEC,
+    SSE_MAX_STREAMS_PER_TOKEN,
+)
+from utils.event_bus import RESYNC, Event, EventBus, event_bus
 
 logger = logging.getLogger("api.server")
 _GUARD_HEADER_NAME = "X-Beanfun-Guard"
@@ -32,6 +46,98 @@ def _error(message: str, status: int = 400) -> web.Response:
     return _json_response({"error": message}, status=status)
 
 
+def _unavailable(e: BeanfunUnavailableError) -> web.Response:
+    res = _error(f"Beanfun is unavailable: {e.endpoint}", 503)
+    res.headers["Retry-After"] = str(max(1, int(e.retry_after + 0.5)))
+    return res
+
+
+def _too_many_requests(wait: float) -> web.Response:
+    res = _error("Too many requests", 429)
+    res.headers["Retry-After"] = retry_after_header(wait)
+    return res
+
+
+async def _audit(
+    request: web.Request, record: TokenRecord, account_model, outcome: str
+):
+    """Buffer an OTP access in the audit log, if one is configured."""
+    audit_log: Optional[AuditLog] = request.app.get("audit_log")
+    if audit_log is None:
+        return
+    await audit_log.record(
+        AuditEvent(
+            channel_id=record.channel_id,
+            token_id=record.id,
+            app_name=record.app_name,
+            action="otp",
+            account=account_model.account,
+            account_name=account_model.account_name,
+            outcome=outcome,
+            remote=request.remote,
+        )
+    )
+
+
+def _etag(request: web.Request, record: TokenRecord) -> str:
+    """
+    Entity tag of the token's view of its channel. The channel's event bus
+    version moves on every login, logout and account list change, and when the
+    cached account list goes stale.
+    """
+    bus: EventBus = request.app["event_bus"]
+    return f'"{bus.epoch}-{record.id}-{bus.version(record.channel_id)}"'
+
+
+def _if_none_match(request: web.Request, etag: str) -> bool:
+    value = etag.strip('"')
+    return any(tag.value in (value, "*") for tag in request.if_none_match or ())
+
+
+def _not_modified(etag: str) -> web.Response:
+    return web.Response(
+        status=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+def _tagged(res: web.Response, etag: str) -> web.Response:
+    res.headers["ETag"] = etag
+    # Clients may keep the response but have to revalidate it every time.
+    res.headers["Cache-Control"] = "private, no-cache"
+    return res
+
+
+async def _notify(bot, channel_id: int, text: str):
+    """
+    Queue a notice on bot.notifier so the response does not wait for Discord.
+    Without a notifier it is posted directly; failures are only logged.
+    """
+    notifier = getattr(bot, "notifier", None)
+    if notifier is not None:
+        notifier.notify(channel_id, text)
+        return
+    try:
+        channel = bot.get_channel(channel_id)
+        if channel:
+            await channel.send(text)
+    except Exception:
+        logger.exception("Failed to send Discord notification")
+
+
+async def _check_heartbeat(login) -> Optional[web.Response]:
+    """An error response if the session turns out to be logged out, else None."""
+    try:
+        heartbeat = await login.get_cached_heartbeat()
+    except BeanfunUnavailableError as e:
+        return _unavailable(e)
+    except Exception as e:
+        logger.exception("Failed to check heartbeat")
+        return _error(f"Failed to check heartbeat: {e}", 500)
+    if heartbeat.ResultCode == 0:
+        return _error("Channel is not logged in", 403)
+    return None
+
+
 async def _extract_token_record(request: web.Request) -> Optional[TokenRecord]:
     """Validate Bearer token from Authorization header."""
     auth = request.headers.get("Authorization", "")
@@ -63,23 +169,137 @@ async def auth_middleware(request: web.Request, handler):
     return await handler(request)
 
 
+@web.middleware
+async def rate_limit_middleware(request: web.Request, handler):
+    limiter: Optional[ApiRateLimiter] = request.app.get("rate_limiter")
+    if limiter is not None:
+        wait = limiter.check_request(request["token_record"])
+        if wait > 0:
+            return _too_many_requests(wait)
+    return await handler(request)
+
+
 async def handle_status(request: web.Request) -> web.Response:
     record: TokenRecord = request["token_record"]
+    etag = _etag(request, record)
+    if _if_none_match(request, etag):
+        return _not_modified(etag)
+
     bot = request.app["bot"]
     login_dict = bot.login_dict
 
     login = login_dict.get(record.channel_id)
     logged_in = login is not None and login.is_login
 
-    return _json_response({
+    return _tagged(_json_response({
         "logged_in": logged_in,
         "channel_name": record.channel_name,
         "app_name": record.app_name,
-    })
+    }), etag)
+
+
+def _status_snapshot(request: web.Request, record: TokenRecord) -> dict:
+    """Login state (and the cached account list, if any) for a new or lagging stream."""
+    login = request.app["bot"].login_dict.get(record.channel_id)
+    logged_in = login is not None and login.is_login
+    snapshot = {"logged_in": logged_in, "channel_name": record.channel_name}
+    accounts = login.game_account_list if logged_in else None
+    if accounts is not None:
+        snapshot["accounts"] = [
+            {"account_name": a.account_name, "account": a.account} for a in accounts
+        ]
+    return snapshot
+
+
+def _sse_message(event_id: int, event_type: str, data: dict) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+
+async def handle_events(request: web.Request) -> web.StreamResponse:
+    """
+    Server-Sent Events of the token's channel: login, logout, heartbeat_lost
+    and account_list_changed. A "status" event with the current state comes
+    first, and again whenever the stream cannot say exactly what was missed.
+    """
+    record: TokenRecord = request["token_record"]
+    streams: Counter = request.app["sse_streams"]
+    if streams[record.id] >= SSE_MAX_STREAMS_PER_TOKEN:
+        return _too_many_requests(SSE_KEEPALIVE_SEC)
+
+    bus: EventBus = request.app["event_bus"]
+    db: TokenDatabase = request.app["token_db"]
+    res = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            # Keep reverse proxies from buffering the stream.
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+    streams[record.id] += 1
+    try:
+        # Subscribe before reading the state so nothing falls in between.
+        with bus.subscribe(record.channel_id) as subscription:
+            await res.prepare(request)
+            missed = None
+            last_event_id = request.headers.get("Last-Event-ID", "")
+            if last_event_id.isdigit():
+                missed = bus.since(record.channel_id, int(last_event_id))
+            if missed is None:
+                await res.write(
+                    _sse_message(
+                        bus.version(record.channel_id),
+                        "status",
+                        _status_snapshot(request, record),
+                    )
+                )
+                seen = bus.version(record.channel_id)
+            else:
+                for event in missed:
+                    await res.write(_sse_message(event.id, event.type, event.data))
+                seen = int(last_event_id) + len(missed)
+
+            while True:
+                try:
+                    event: Event = await asyncio.wait_for(
+                        subscription.get(), SSE_KEEPALIVE_SEC
+                    )
+                except asyncio.TimeoutError:
+                    # Streams outlive their request, so check the token again.
+                    if await db.validate_token(record.token) is None:
+                        await res.write(_sse_message(seen, "revoked", {}))
+                        break
+                    await res.write(b": keepalive\n\n")
+                    continue
+                if event.id <= seen:
+                    continue
+                seen = event.id
+                if event.type == RESYNC:
+                    await res.write(
+                        _sse_message(
+                            event.id, "status", _status_snapshot(request, record)
+                        )
+                    )
+                else:
+                    await res.write(_sse_message(event.id, event.type, event.data))
+    except ConnectionResetError:
+        pass
+    finally:
+        streams[record.id] -= 1
+        if not streams[record.id]:
+            del streams[record.id]
+    return res
 
 
 async def handle_get_accounts(request: web.Request) -> web.Response:
     record: TokenRecord = request["token_record"]
+    # Logins, logouts and the list changing or going stale all move the version.
+    etag = _etag(request, record)
+    if _if_none_match(request, etag):
+        return _not_modified(etag)
+
     bot = request.app["bot"]
     login_dict = bot.login_dict
 
@@ -89,15 +309,19 @@ async def handle_get_accounts(request: web.Request) -> web.Response:
 
     try:
         account_list = await login.get_maplestory_account_list()
+    except BeanfunUnavailableError as e:
+        return _unavailable(e)
     except Exception as e:
         logger.exception("Failed to get account list")
         return _error(f"Failed to get account list: {e}", 500)
 
+    # Taken after the fetch, which may itself have announced a new list.
+    etag = _etag(request, record)
     accounts = [
         {"account_name": a.account_name, "account": a.account}
         for a in account_list
     ]
-    return _json_response({"accounts": accounts})
+    return _tagged(_json_response({"accounts": accounts}), etag)
 
 
 async def handle_post_account(request: web.Request) -> web.Response:
@@ -118,36 +342,45 @@ async def handle_post_account(request: web.Request) -> web.Response:
     if not account_id:
         return _error("Missing 'account' field in request body", 400)
 
+    res = await _check_heartbeat(login)
+    if res is not None:
+        return res
+
     try:
-        account_list = await login.get_maplestory_account_list()
+        account_model = await login.find_account(account_id)
+    except BeanfunUnavailableError as e:
+        return _unavailable(e)
     except Exception as e:
         logger.exception("Failed to get account list")
         return _error(f"Failed to get account list: {e}", 500)
 
-    account_model = None
-    for a in account_list:
-        if a.account == account_id:
-            account_model = a
-            break
-
     if account_model is None:
         return _error("Account not found", 404)
 
+    # Charged only once the request is valid and the account exists.
+    limiter: Optional[ApiRateLimiter] = request.app.get("rate_limiter")
+    if limiter is not None:
+        wait = limiter.check_otp(record)
+        if wait > 0:
+            return _too_many_requests(wait)
+
     try:
         otp = await login.get_account_otp(account=account_model)
+    except BeanfunUnavailableError as e:
+        await _audit(request, record, account_model, "unavailable")
+        return _unavailable(e)
     except Exception as e:
         logger.exception("Failed to get OTP")
+        await _audit(request, record, account_model, "error")
         return _error(f"Failed to get OTP: {e}", 500)
+    await _audit(request, record, account_model, "ok")
 
-    try:
-        channel = bot.get_channel(record.channel_id)
-        if channel:
-            await channel.send(
-                f"應用程式 **{record.app_name}** 取得了帳號 "
-                f"{account_model.account_name} 的密碼"
-            )
-    except Exception:
-        logger.exception("Failed to send Discord notification")
+    await _notify(
+        bot,
+        record.channel_id,
+        f"應用程式 **{record.app_name}** 取得了帳號 "
+        f"{account_model.account_name} 的密碼",
+    )
 
     return _json_response({
         "account_name": account_model.account_name,
@@ -156,13 +389,110 @@ async def handle_post_account(request: web.Request) -> web.Response:
     })
 
 
-def create_api_app(bot, db: TokenDatabase) -> web.Application:
-    app = web.Application(middlewares=[auth_middleware])
+async def handle_post_account_batch(request: web.Request) -> web.Response:
+    """
+    OTPs of several accounts in one request. They are fetched concurrently
+    (bounded per session by BeanfunLogin) and each account gets its own
+    result or error, in the order asked for.
+    """
+    record: TokenRecord = request["token_record"]
+    bot = request.app["bot"]
+
+    login = bot.login_dict.get(record.channel_id)
+    if login is None or not login.is_login:
+        return _error("Channel is not logged in", 403)
+
+    try:
+        body = await request.json()
+    except Exception:
+        return _error("Invalid JSON body", 400)
+
+    account_ids = body.get("accounts") if isinstance(body, dict) else None
+    if (
+        not isinstance(account_ids, list)
+        or not account_ids
+        or not all(isinstance(i, str) and i for i in account_ids)
+    ):
+        return _error("'accounts' must be a non-empty list of account ids", 400)
+    account_ids = list(dict.fromkeys(account_ids))
+    if len(account_ids) > API_BATCH_MAX_ACCOUNTS:
+        return _error(f"At most {API_BATCH_MAX_ACCOUNTS} accounts per request", 400)
+
+    res = await _check_heartbeat(login)
+    if res is not None:
+        return res
+
+    try:
+        accounts = await login.find_accounts(account_ids)
+    except BeanfunUnavailableError as e:
+        return _unavailable(e)
+    except Exception as e:
+        logger.exception("Failed to get account list")
+        return _error(f"Failed to get account list: {e}", 500)
+
+    found = [accounts[i] for i in account_ids if accounts[i] is not None]
+    granted, wait = len(found), 0.0
+    limiter: Optional[ApiRateLimiter] = request.app.get("rate_limiter")
+    if limiter is not None and found:
+        granted, wait = limiter.check_otps(record, len(found))
+        if granted == 0:
+            return _too_many_requests(wait)
+
+    async def fetch(account_model) -> dict:
+        try:
+            otp = await login.get_account_otp(account=account_model)
+        except BeanfunUnavailableError as e:
+            await _audit(request, record, account_model, "unavailable")
+            return {"error": f"Beanfun is unavailable: {e.endpoint}", "status": 503}
+        except Exception as e:
+            logger.exception("Failed to get OTP")
+            await _audit(request, record, account_model, "error")
+            return {"error": f"Failed to get OTP: {e}", "status": 500}
+        await _audit(request, record, account_model, "ok")
+        return {"account_name": account_model.account_name, "otp": otp}
+
+    fetched = await asyncio.gather(*(fetch(a) for a in found[:granted]))
+    results = {a.account: r for a, r in zip(found, fetched)}
+    for account_model in found[granted:]:
+        results[account_model.account] = {"error": "Too many requests", "status": 429}
+
+    names = [a.account_name for a, r in zip(found, fetched) if "otp" in r]
+    if names:
+        await _notify(
+            bot,
+            record.channel_id,
+            f"應用程式 **{record.app_name}** 取得了 {len(names)} 個帳號的密碼："
+            + "、".join(names),
+        )
+
+    missing = {"error": "Account not found", "status": 404}
+    res = _json_response({
+        "results": [{"account": i, **results.get(i, missing)} for i in account_ids]
+    })
+    if granted < len(found):
+        res.headers["Retry-After"] = retry_after_header(wait)
+    return res
+
+
+def create_api_app(
+    bot,
+    db: TokenDatabase,
+    audit_log: Optional[AuditLog] = None,
+    rate_limiter: Optional[ApiRateLimiter] = None,
+) -> web.Application:
+    app = web.Application(middlewares=[auth_middleware, rate_limit_middleware])
     app["bot"] = bot
     app["token_db"] = db
+    app["audit_log"] = audit_log
+    app["rate_limiter"] = rate_limiter
+    app["event_bus"] = event_bus
+    # token id -> open /events streams
+    app["sse_streams"] = Counter()
 
     app.router.add_get("/status", handle_status)
     app.router.add_get("/account", handle_get_accounts)
     app.router.add_post("/account", handle_post_account)
+    app.router.add_post("/account/batch", handle_post_account_batch)
+    app.router.add_get("/events", handle_events)
 
     return app
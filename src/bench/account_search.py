@@ -0,0 +1,122 @@
+"""
+Cost of one /game autocomplete keystroke.
+
+Builds an AccountIndex over --sizes synthetic account lists, then times
+AccountIndex.search for prefix, substring, fuzzy, empty and missing queries
+with a recent-use map covering a tenth of the accounts.
+
+    cd src && python -m bench.account_search --output account_search.json
+"""
+
+import argparse
+import random
+import time
+
+from bench.common import environment, load_result, print_comparison, write_result
+from utils.account_index import AccountIndex
+from utils.model import MSAccountModel
+
+QUERIES = {
+    "empty": "",
+    "prefix": "main",
+    "substring": "alt",
+    "fuzzy": "mn1",
+    "no match": "zzzz",
+}
+
+
+def accounts(count: int) -> list:
+    roles = ("Main", "Alt", "Farm", "Mule")
+    return [
+        MSAccountModel(
+            account_name=f"{roles[i % len(roles)]}Char{i}",
+            account=f"acct{i:05d}",
+            sn=str(i),
+        )
+        for i in range(count)
+    ]
+
+
+def timed(fn, iterations: int) -> float:
+    """Microseconds per call."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(args) -> dict:
+    result = {}
+    for size in args.sizes:
+        items = accounts(size)
+        last_used = {
+            a.account: time.time() - random.uniform(0, 86400)
+            for a in random.sample(items, max(1, size // 10))
+        }
+        entry = {
+            "build_us": timed(
+                lambda: AccountIndex(items), max(1, args.iterations // 10)
+            )
+        }
+        index = AccountIndex(items)
+        for name, query in QUERIES.items():
+            entry[f"{name}_us"] = timed(
+                lambda: index.search(query, last_used), args.iterations
+            )
+            entry[f"{name}_results"] = len(index.search(query, last_used))
+        result[str(size)] = entry
+    return {
+        "benchmark": "account_search",
+        "environment": environment(),
+        "parameters": {"sizes": args.sizes, "iterations": args.iterations},
+        "search": result,
+        "throughput": {
+            f"{size} accounts {name}": 1e6 / entry[f"{name}_us"]
+            for size, entry in result.items()
+            for name in QUERIES
+        },
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark account autocomplete")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Account list sizes",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=2000, help="Searches per query"
+    )
+    parser.add_argument("--output", help="Write the result as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON result to compare against")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = run(args)
+
+    print(
+        f"{'accounts':>8}  {'build':>8}" + "".join(f"  {name:>14}" for name in QUERIES)
+    )
+    for size, entry in result["search"].items():
+        print(
+            f"{size:>8}  {entry['build_us']:>6.1f}us"
+            + "".join(
+                f"  {entry[f'{name}_us']:>6.1f}us ({entry[f'{name}_results']:>2})"
+                for name in QUERIES
+            )
+        )
+
+    if args.output:
+        write_result(args.output, result)
+        print(f"Result written to {args.output}")
+    if args.compare:
+        print_comparison(load_result(args.compare), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Overhead of the API rate limiter.
+
+Times ApiRateLimiter.check_request / check_otp on their own with --keys
+distinct tokens, then GET /status through the real API app (auth, token
+cache and middleware) with and without the limiter. Limits are set high
+enough that nothing is rejected, so only the bookkeeping cost is measured.
+
+    cd src && python -m bench.api_rate_limit --requests 5000 --output rate_limit.json
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from api.rate_limit import ApiRateLimiter
+from api.server import create_api_app
+from bench.common import (
+    LatencyRecorder,
+    environment,
+    load_result,
+    print_comparison,
+    print_summary,
+    write_result,
+)
+from database.token_db import TokenDatabase, TokenRecord
+
+_UNLIMITED = dict(
+    rate_per_sec=1e9,
+    burst=1e9,
+    otp_per_min=1e9,
+    otp_burst=1e9,
+    channel_otp_per_min=1e9,
+    channel_otp_burst=1e9,
+)
+
+
+class _Bot:
+    def __init__(self):
+        self.login_dict = {}
+
+    def get_channel(self, channel_id):
+        return None
+
+
+def _record(i: int) -> TokenRecord:
+    return TokenRecord(
+        (i, f"token-{i}", "bench", i % 100, "bench", i, "bench", 0, None, 0, None)
+        + (None, None)
+    )
+
+
+def micro(keys: int, calls: int) -> dict:
+    """Nanoseconds per limiter call."""
+    limiter = ApiRateLimiter(**_UNLIMITED, max_keys=keys)
+    records = [_record(i) for i in range(keys)]
+    for record in records:
+        limiter.check_request(record)
+
+    result = {}
+    for name, check in (
+        ("check_request", limiter.check_request),
+        ("check_otp", limiter.check_otp),
+    ):
+        started = time.perf_counter_ns()
+        for i in range(calls):
+            check(records[i % keys])
+        result[f"{name}_ns"] = (time.perf_counter_ns() - started) / calls
+    return result
+
+
+async def _serve(app: web.Application):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def through_app(requests: int, recorder: LatencyRecorder):
+    directory = tempfile.mkdtemp(prefix="bench_rate_limit_")
+    db = TokenDatabase(os.path.join(directory, "tokens.db"))
+    await db.init()
+    token = await db.create_token("bench", 1, "bench", 1, "bench")
+    headers = {"Authorization": f"Bearer {token}", "X-Beanfun-Guard": "discord-beanfun"}
+    try:
+        for name, limiter in (
+            ("GET /status without limiter", None),
+            ("GET /status with limiter", ApiRateLimiter(**_UNLIMITED)),
+        ):
+            runner, base_url = await _serve(
+                create_api_app(_Bot(), db, rate_limiter=limiter)
+            )
+            async with aiohttp.ClientSession(headers=headers) as session:
+                # Warm up the connection and the token cache.
+                for _ in range(50):
+                    async with session.get(f"{base_url}/status") as res:
+                        await res.read()
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    async with session.get(f"{base_url}/status") as res:
+                        await res.read()
+                        if res.status != 200:
+                            recorder.record_error(name)
+                            continue
+                    recorder.record(name, time.perf_counter() - started)
+            await runner.cleanup()
+    finally:
+        await db.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+async def run(args) -> dict:
+    recorder = LatencyRecorder()
+    micro_result = {f"{keys}_keys": micro(keys, args.calls) for keys in (1, args.keys)}
+    await through_app(args.requests, recorder)
+    latency = recorder.summary()
+    return {
+        "benchmark": "api_rate_limit",
+        "environment": environment(),
+        "parameters": {
+            "keys": args.keys,
+            "calls": args.calls,
+            "requests": args.requests,
+        },
+        "micro": micro_result,
+        "throughput": {
+            name: 1000 / entry["mean_ms"]
+            for name, entry in latency.items()
+            if entry.get("mean_ms")
+        },
+        "latency": latency,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the API rate limiter")
+    parser.add_argument("--keys", type=int, default=10000, help="Distinct tokens")
+    parser.add_argument(
+        "--calls", type=int, default=200_000, help="Limiter calls per measurement"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=3000, help="HTTP requests per variant"
+    )
+    parser.add_argument("--output", help="Write the result as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON result to compare against")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = asyncio.run(run(args))
+
+    print("Limiter cost per call")
+    for keys, entry in result["micro"].items():
+        print(
+            f"  {keys:<12} check_request {entry['check_request_ns'] / 1000:.2f} us, "
+            f"check_otp {entry['check_otp_ns'] / 1000:.2f} us"
+        )
+    print_summary("HTTP latency", result["latency"])
+
+    if args.output:
+        write_result(args.output, result)
+        print(f"Result written to {args.output}")
+    if args.compare:
+        print_comparison(load_result(args.compare), result)
+
+
+if __name__ == "__main__":
+    main()
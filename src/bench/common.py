@@ -0,0 +1,210 @@
+"""
+Shared helpers for the benchmark scripts: latency percentiles, event-loop
+lag, RSS and JSON result files that can be compared between commits.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_samples) + 0.5)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Count, mean, p50/p95/p99 and max of `samples` (seconds), reported in ms."""
+    ordered = sorted(samples)
+    summary = {"count": len(ordered)}
+    if not ordered:
+        return summary
+    summary["mean_ms"] = sum(ordered) / len(ordered) * 1000
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = percentile(ordered, pct) * 1000
+    summary["max_ms"] = ordered[-1] * 1000
+    return summary
+
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def histogram(samples: List[float], buckets_ms=HISTOGRAM_BUCKETS_MS) -> Dict[str, int]:
+    """Counts of `samples` (seconds) per latency bucket, keyed by upper bound."""
+    counts = {f"<={bound}ms": 0 for bound in buckets_ms}
+    counts[f">{buckets_ms[-1]}ms"] = 0
+    for sample in samples:
+        ms = sample * 1000
+        for bound in buckets_ms:
+            if ms <= bound:
+                counts[f"<={bound}ms"] += 1
+                break
+        else:
+            counts[f">{buckets_ms[-1]}ms"] += 1
+    return counts
+
+
+def print_histogram(title: str, counts: Dict[str, int], width: int = 40):
+    total = sum(counts.values())
+    if not total:
+        return
+    peak = max(counts.values())
+    print(f"\n{title}")
+    for label, count in counts.items():
+        bar = "#" * round(count / peak * width) if peak else ""
+        print(f"  {label:>10} {count:>8} {count / total * 100:>6.1f}% {bar}")
+
+
+class LatencyRecorder:
+    """Collects latency samples and error counts per operation name."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def record_error(self, name: str):
+        self.errors[name] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        names = sorted(set(self.samples) | set(self.errors))
+        result = {}
+        for name in names:
+            entry = summarize(self.samples.get(name, []))
+            entry["errors"] = self.errors.get(name, 0)
+            result[name] = entry
+        return result
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag by sleeping `interval` seconds repeatedly and
+    recording how late each wake-up was.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def summary(self) -> Dict[str, float]:
+        return summarize(self.samples)
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_result(path: str, result: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def load_result(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_summary(title: str, latencies: Dict[str, dict]):
+    print(f"\n{title}")
+    print(
+        f"{'operation':<30}{'count':>8}{'errors':>8}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for name, entry in latencies.items():
+        print(
+            f"{name:<30}{entry['count']:>8}{entry.get('errors', 0):>8}"
+            f"{entry.get('p50_ms', 0):>10.1f}{entry.get('p95_ms', 0):>10.1f}"
+            f"{entry.get('p99_ms', 0):>10.1f}{entry.get('max_ms', 0):>10.1f}"
+        )
+
+
+def print_comparison(baseline: dict, current: dict):
+    """Print p50/p95/p99 and throughput changes between two result files."""
+    print(
+        f"\nCompared with {baseline['environment'].get('commit')} "
+        f"({baseline['environment'].get('timestamp')})"
+    )
+    for name, entry in current["latency"].items():
+        base = baseline["latency"].get(name)
+        if not base:
+            continue
+        changes = []
+        for pct in PERCENTILES:
+            key = f"p{pct}_ms"
+            if base.get(key):
+                changes.append(
+                    f"{key} {(entry.get(key, 0) / base[key] - 1) * 100:+.1f}%"
+                )
+        print(f"  {name:<30}{'  '.join(changes)}")
+    for key, value in current["throughput"].items():
+        base = baseline["throughput"].get(key)
+        if base:
+            print(f"  {key:<30}{value:.1f} ({(value / base - 1) * 100:+.1f}%)")
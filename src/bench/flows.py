@@ -0,0 +1,240 @@
+"""
+End-to-end throughput benchmark of the login and OTP flows.
+
+Drives N simulated channels through get_login_info -> waiting_login_loop ->
+get_maplestory_account_list -> get_account_otp against the offline mock
+Beanfun server, and reports per-step p50/p95/p99 latency, throughput,
+event-loop lag and RSS.
+
+    cd src && python -m bench.flows --channels 200 --otps 3 --output flows.json
+    cd src && python -m bench.flows --channels 200 --compare flows.json
+
+The mock server is a single host, so the per-host limiter meant to protect
+Beanfun would cap every run at BEANFUN_HOST_RATE_PER_SEC. By default the
+benchmark lifts it for the mock host; pass --host-rate / --host-burst /
+--host-concurrency to measure under real limits. The time requests spent
+queued in the limiter is reported next to the results. Other limits
+(LOGIN_POLL_FAST_SEC, HTTP_POOL_SIZE_PER_HOST, ...) apply as configured.
+"""
+
+import argparse
+import asyncio
+import time
+
+from yarl import URL
+
+from bench.common import (
+    LatencyRecorder,
+    LoopLagMonitor,
+    environment,
+    load_result,
+    print_comparison,
+    print_summary,
+    rss_mb,
+    write_result,
+)
+from methods.beanfun import BeanfunLogin
+from methods.heartbeat import heartbeat_scheduler
+from methods.login_poller import login_poller
+from methods.transport import close_transport, set_host_limits, transport_stats
+from mock_beanfun import start_mock_server
+from utils import config
+
+
+# Stands in for "no limit" in the mock host's limiter.
+_UNLIMITED = 1e9
+
+
+async def _timed(recorder: LatencyRecorder, name: str, coro):
+    started = time.perf_counter()
+    try:
+        result = await coro
+    except Exception:
+        recorder.record_error(name)
+        raise
+    recorder.record(name, time.perf_counter() - started)
+    return result
+
+
+async def run_channel(
+    channel_id: int, base_url: str, otps: int, recorder: LatencyRecorder
+):
+    login = BeanfunLogin(channel_id, base_url=base_url)
+    started = time.perf_counter()
+    try:
+        await _timed(recorder, "get_login_info", login.get_login_info())
+
+        done = asyncio.get_running_loop().create_future()
+
+        async def callback(status: int):
+            if not done.done():
+                done.set_result(status)
+
+        wait_started = time.perf_counter()
+        await login.waiting_login_loop(callback)
+        status = await done
+        if status != 1:
+            recorder.record_error("waiting_login_loop")
+            return
+        recorder.record("waiting_login_loop", time.perf_counter() - wait_started)
+
+        accounts = await _timed(
+            recorder, "get_maplestory_account_list", login.get_maplestory_account_list()
+        )
+        for i in range(otps):
+            await _timed(
+                recorder,
+                "get_account_otp",
+                login.get_account_otp(accounts[i % len(accounts)]),
+            )
+        recorder.record("flow", time.perf_counter() - started)
+    except Exception:
+        recorder.record_error("flow")
+    finally:
+        await login.close_connection()
+
+
+async def run(args) -> dict:
+    runner, base_url = await start_mock_server(
+        accounts=args.accounts,
+        scan_after=args.scan_after,
+        latency=(0.0, args.latency),
+        error_rate=args.error_rate,
+    )
+    state = runner.app["state"]
+    host_rate = args.host_rate or _UNLIMITED
+    host_burst = args.host_burst or max(1.0, host_rate)
+    host_concurrency = args.host_concurrency or int(_UNLIMITED)
+    set_host_limits(URL(base_url).host, host_rate, host_burst, host_concurrency)
+    recorder = LatencyRecorder()
+    lag = LoopLagMonitor()
+    semaphore = asyncio.Semaphore(args.concurrency or args.channels)
+    rss_before = rss_mb()
+    rss_peak = rss_before
+
+    async def guarded(channel_id: int):
+        nonlocal rss_peak
+        async with semaphore:
+            await run_channel(channel_id, base_url, args.otps, recorder)
+        rss_peak = max(rss_peak, rss_mb())
+
+    lag.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(guarded(i) for i in range(args.channels)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await lag.stop()
+        login_poller.stop()
+        heartbeat_scheduler.stop()
+        limiter_stats = transport_stats()
+        await close_transport()
+        await runner.cleanup()
+
+    latency = recorder.summary()
+    upstream_requests = sum(state.requests.values())
+    return {
+        "benchmark": "flows",
+        "environment": environment(),
+        "parameters": {
+            "channels": args.channels,
+            "concurrency": args.concurrency or args.channels,
+            "otps": args.otps,
+            "accounts": args.accounts,
+            "scan_after": args.scan_after,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "host_rate_per_sec": args.host_rate or None,
+            "host_burst": args.host_burst or None,
+            "host_max_concurrency": args.host_concurrency or None,
+            "login_poll_fast_sec": config.LOGIN_POLL_FAST_SEC,
+        },
+        "elapsed_sec": elapsed,
+        "throughput": {
+            "flows_per_sec": latency.get("flow", {}).get("count", 0) / elapsed,
+            "otp_per_sec": latency.get("get_account_otp", {}).get("count", 0) / elapsed,
+            "upstream_requests_per_sec": upstream_requests / elapsed,
+        },
+        "latency": latency,
+        "event_loop_lag": lag.summary(),
+        "rss_mb": {"before": rss_before, "peak": rss_peak, "after": rss_mb()},
+        "upstream_requests": dict(state.requests),
+        "host_limiters": limiter_stats,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the login and OTP flows against the mock Beanfun server"
+    )
+    parser.add_argument("--channels", type=int, default=50, help="Simulated channels")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Channels running at once, 0 for all of them",
+    )
+    parser.add_argument("--otps", type=int, default=3, help="OTPs per channel")
+    parser.add_argument("--accounts", type=int, default=3, help="Accounts per login")
+    parser.add_argument(
+        "--scan-after", type=float, default=0.5, help="Seconds until QR is scanned"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Max mock latency per request (s)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Mock HTTP 500 probability"
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=0,
+        help="Mock host requests/s through the host limiter, 0 for no limit",
+    )
+    parser.add_argument(
+        "--host-burst",
+        type=float,
+        default=0,
+        help="Mock host limiter burst, 0 for --host-rate (at least 1)",
+    )
+    parser.add_argument(
+        "--host-concurrency",
+        type=int,
+        default=0,
+        help="Mock host requests in flight, 0 for no limit",
+    )
+    parser.add_argument("--output", help="Write the result as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON result to compare against")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = asyncio.run(run(args))
+
+    print(
+        f"{args.channels} channels in {result['elapsed_sec']:.2f}s, "
+        f"{result['throughput']['flows_per_sec']:.1f} flows/s, "
+        f"{result['throughput']['otp_per_sec']:.1f} OTP/s, "
+        f"{result['throughput']['upstream_requests_per_sec']:.1f} upstream req/s"
+    )
+    print_summary("Latency", result["latency"])
+    print_summary("Event loop lag", {"lag": result["event_loop_lag"]})
+    print("\nHost limiter")
+    for host, stats in result["host_limiters"].items():
+        print(
+            f"  {host:<30}granted {stats['granted']}, queued {stats['waited']}, "
+            f"wait avg {stats['wait_avg_ms']:.1f} ms, max {stats['wait_max_ms']:.1f} ms"
+        )
+    rss = result["rss_mb"]
+    print(f"\nRSS {rss['before']:.1f} MiB -> peak {rss['peak']:.1f} MiB")
+
+    if args.output:
+        write_result(args.output, result)
+        print(f"Result written to {args.output}")
+    if args.compare:
+        print_comparison(load_result(args.compare), result)
+
+
+if __name__ == "__main__":
+    main()
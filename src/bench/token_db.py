@@ -0,0 +1,300 @@
+"""
+Latency of TokenDatabase reads and writes at a realistic table size.
+
+Fills a temporary database with --rows tokens spread over --channels
+channels, then times validate_token (with the in-memory cache disabled, so
+every call hits SQLite, and with it enabled), list_tokens,
+list_user_tokens, create_token and revoke_token one call at a time. A final
+phase runs --concurrency callers at once, 90% uncached reads and 10%
+create_token, to show how reads scale over the read pool (--read-pool-size).
+
+    cd src && python -m bench.token_db --rows 100000 --output token_db.json
+    cd src && python -m bench.token_db --rows 100000 --drop-indexes
+
+--drop-indexes removes the secondary indexes after migrating, to show what
+they are worth.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import tempfile
+import time
+
+import aiosqlite
+
+from bench.common import (
+    LatencyRecorder,
+    environment,
+    load_result,
+    print_comparison,
+    print_summary,
+    rss_mb,
+    write_result,
+)
+from database.token_db import TokenDatabase
+
+_INSERT_BATCH = 5000
+
+
+async def fill(db_path: str, rows: int, channels: int, users: int) -> list:
+    """Insert `rows` tokens directly; returns (token, id, channel, user) samples."""
+    samples = []
+    now = time.time()
+    async with aiosqlite.connect(db_path) as db:
+        for start in range(0, rows, _INSERT_BATCH):
+            batch = []
+            for i in range(start, min(rows, start + _INSERT_BATCH)):
+                channel_id = random.randrange(channels)
+                user_id = random.randrange(users)
+                token = secrets.token_urlsafe(32)
+                revoked = 1 if random.random() < 0.2 else 0
+                batch.append(
+                    (
+                        token,
+                        f"app-{i}",
+                        channel_id,
+                        f"channel-{channel_id}",
+                        user_id,
+                        f"user-{user_id}",
+                        now - random.uniform(0, 86400 * 90),
+                        None,
+                        revoked,
+                    )
+                )
+                if len(samples) < 2000 and not revoked:
+                    samples.append((token, start + len(batch), channel_id, user_id))
+            await db.executemany(
+                """
+                INSERT INTO api_tokens
+                    (token, app_name, channel_id, channel_name, discord_user_id,
+                     discord_username, created_at, expires_at, revoked)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                batch,
+            )
+            await db.commit()
+    return samples
+
+
+async def query_plans(db_path: str) -> dict:
+    plans = {}
+    queries = {
+        "list_tokens": (
+            "SELECT * FROM api_tokens WHERE channel_id = ? AND revoked = 0 "
+            "ORDER BY created_at DESC",
+            (1,),
+        ),
+        "list_user_tokens": (
+            "SELECT * FROM api_tokens WHERE channel_id = ? AND discord_user_id = ? "
+            "AND revoked = 0 ORDER BY created_at DESC",
+            (1, 1),
+        ),
+    }
+    async with aiosqlite.connect(db_path) as db:
+        for name, (sql, params) in queries.items():
+            cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plans[name] = [row[-1] for row in await cursor.fetchall()]
+    return plans
+
+
+async def timed_loop(recorder: LatencyRecorder, name: str, iterations: int, make):
+    for i in range(iterations):
+        started = time.perf_counter()
+        await make(i)
+        recorder.record(name, time.perf_counter() - started)
+
+
+async def concurrent_mix(
+    db: TokenDatabase,
+    recorder: LatencyRecorder,
+    samples: list,
+    concurrency: int,
+    operations: int,
+) -> float:
+    """Run `operations` mixed calls over `concurrency` workers; returns ops/sec."""
+    remaining = operations
+
+    async def worker(index: int):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            token, _, channel_id, user_id = random.choice(samples)
+            roll = random.random()
+            started = time.perf_counter()
+            if roll < 0.1:
+                name = "concurrent create_token"
+                await db.create_token("bench", channel_id, "bench", user_id, "bench")
+            elif roll < 0.6:
+                name = "concurrent validate_token"
+                await db.validate_token(token)
+            else:
+                name = "concurrent list_user_tokens"
+                await db.list_user_tokens(channel_id, user_id)
+            recorder.record(name, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return operations / (time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_token_db_")
+    db_path = os.path.join(directory, "tokens.db")
+
+    migrator = TokenDatabase(db_path)
+    await migrator.init()
+    await migrator.close()
+    if args.drop_indexes:
+        async with aiosqlite.connect(db_path) as db:
+            await db.executescript(
+                "DROP INDEX IF EXISTS idx_api_tokens_channel_active;"
+                "DROP INDEX IF EXISTS idx_api_tokens_channel_user_active;"
+            )
+
+    fill_started = time.perf_counter()
+    samples = await fill(db_path, args.rows, args.channels, args.users)
+    fill_sec = time.perf_counter() - fill_started
+    plans = await query_plans(db_path)
+
+    recorder = LatencyRecorder()
+    uncached = TokenDatabase(db_path, cache_size=0, read_pool_size=args.read_pool_size)
+    cached = TokenDatabase(db_path)
+    await uncached.init()
+    await cached.init()
+    n = args.iterations
+    try:
+        await timed_loop(
+            recorder,
+            "validate_token (no cache)",
+            n,
+            lambda i: uncached.validate_token(samples[i % len(samples)][0]),
+        )
+        await timed_loop(
+            recorder,
+            "validate_token (cached)",
+            n,
+            lambda i: cached.validate_token(samples[i % 50][0]),
+        )
+        await timed_loop(
+            recorder,
+            "validate_token (invalid)",
+            n,
+            lambda i: uncached.validate_token(secrets.token_urlsafe(32)),
+        )
+        await timed_loop(
+            recorder,
+            "list_tokens",
+            n,
+            lambda i: uncached.list_tokens(samples[i % len(samples)][2]),
+        )
+        await timed_loop(
+            recorder,
+            "list_user_tokens",
+            n,
+            lambda i: uncached.list_user_tokens(
+                samples[i % len(samples)][2], samples[i % len(samples)][3]
+            ),
+        )
+        await timed_loop(
+            recorder,
+            "create_token",
+            n,
+            lambda i: uncached.create_token("bench", i, "bench", i, "bench"),
+        )
+        await timed_loop(
+            recorder,
+            "revoke_token",
+            n,
+            lambda i: uncached.revoke_token(samples[i % len(samples)][1]),
+        )
+        mixed_ops_per_sec = await concurrent_mix(
+            uncached, recorder, samples, args.concurrency, n * 5
+        )
+    finally:
+        await uncached.close()
+        await cached.close()
+
+    db_size = os.path.getsize(db_path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.rmdir(directory)
+
+    return {
+        "benchmark": "token_db",
+        "environment": environment(),
+        "parameters": {
+            "rows": args.rows,
+            "channels": args.channels,
+            "users": args.users,
+            "iterations": n,
+            "drop_indexes": args.drop_indexes,
+            "read_pool_size": args.read_pool_size,
+            "concurrency": args.concurrency,
+        },
+        "fill_sec": fill_sec,
+        "db_size_mb": db_size / (1024 * 1024),
+        "query_plans": plans,
+        "throughput": {
+            **{
+                name: 1000 / entry["mean_ms"]
+                for name, entry in recorder.summary().items()
+                if entry.get("mean_ms") and not name.startswith("concurrent")
+            },
+            "concurrent mix": mixed_ops_per_sec,
+        },
+        "latency": recorder.summary(),
+        "rss_mb": rss_mb(),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark TokenDatabase")
+    parser.add_argument("--rows", type=int, default=100_000, help="Tokens in table")
+    parser.add_argument("--channels", type=int, default=5000, help="Distinct channels")
+    parser.add_argument("--users", type=int, default=20, help="Users per channel")
+    parser.add_argument(
+        "--iterations", type=int, default=2000, help="Calls per operation"
+    )
+    parser.add_argument(
+        "--read-pool-size", type=int, default=4, help="TokenDatabase read connections"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="Callers in the concurrent phase"
+    )
+    parser.add_argument(
+        "--drop-indexes", action="store_true", help="Benchmark without indexes"
+    )
+    parser.add_argument("--output", help="Write the result as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON result to compare against")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = asyncio.run(run(args))
+
+    print(
+        f"{args.rows} rows filled in {result['fill_sec']:.1f}s, "
+        f"{result['db_size_mb']:.1f} MiB"
+    )
+    for name, plan in result["query_plans"].items():
+        print(f"  {name}: {' / '.join(plan)}")
+    print_summary("Latency", result["latency"])
+    print(
+        f"\nConcurrent mix: {result['throughput']['concurrent mix']:.0f} ops/s "
+        f"with {args.concurrency} callers over {args.read_pool_size} read connections"
+    )
+
+    if args.output:
+        write_result(args.output, result)
+        print(f"Result written to {args.output}")
+    if args.compare:
+        print_comparison(load_result(args.compare), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import datetime
-from typing import Any, Coroutine, List
+from typing import Any, Coroutine, List, Optional
 
 import discord
 from discord import app_commands
@@ -162,14 +162,8 @@ class ApiCog(commands.Cog):
             exp = "永久" if t.expires_at is None else datetime.datetime.fromtimestamp(
                 t.expires_at
             ).strftime("%Y-%m-%d %H:%M")
-            status = "有效"
-            if t.expires_at is not None:
-                import time
-                if time.time() > t.expires_at:
-                    status = "已過期"
             lines.append(
-                f"- **{t.app_name}** | 建立者: {t.discord_username} | "
-                f"到期: {exp} | 狀態: {status}"
+                f"- **{t.app_name}** | 建立者: {t.discord_username} | 到期: {exp}"
             )
 
         await interaction.response.send_message(
@@ -197,6 +191,71 @@ class ApiCog(commands.Cog):
             ephemeral=True,
         )
 
+    @app_commands.command(name="app-limit", description="設定應用程式每分鐘可取得 OTP 的次數")
+    @app_commands.describe(
+        app_name="應用程式名稱",
+        per_minute="每分鐘次數，留空恢復預設值",
+        burst="可連續取得的次數，留空恢復預設值",
+    )
+    @app_commands.default_permissions(manage_guild=True)
+    async def app_limit(
+        self,
+        interaction: discord.Interaction,
+        app_name: str,
+        per_minute: Optional[app_commands.Range[float, 0.1, 600.0]] = None,
+        burst: Optional[app_commands.Range[int, 1, 100]] = None,
+    ):
+        db = self.bot.token_db
+        tokens = [
+            t for t in await db.list_tokens(interaction.channel_id)
+            if t.app_name == app_name
+        ]
+        if not tokens:
+            await interaction.response.send_message(
+                f"本頻道沒有名為 **{app_name}** 的應用程式", ephemeral=True
+            )
+            return
+
+        for t in tokens:
+            await db.set_otp_rate_limit(t.id, per_minute, burst)
+
+        limit_text = "預設值" if per_minute is None else f"每分鐘 {per_minute:g} 次"
+        burst_text = "預設值" if burst is None else f"{burst} 次"
+        await interaction.response.send_message(
+            f"已設定 **{app_name}** 的 OTP 限制：{limit_text}，連續 {burst_text}",
+            ephemeral=True,
+        )
+
+    @app_commands.command(name="app-access", description="查看本頻道最近的 API 存取紀錄")
+    async def app_access(self, interaction: discord.Interaction):
+        audit_log = getattr(self.bot, "audit_log", None)
+        if audit_log is None:
+            await interaction.response.send_message("未啟用存取紀錄", ephemeral=True)
+            return
+
+        events = await audit_log.recent_for_channel(interaction.channel_id, limit=20)
+        if not events:
+            await interaction.response.send_message(
+                "本頻道沒有 API 存取紀錄", ephemeral=True
+            )
+            return
+
+        outcome_text = {"ok": "成功", "error": "失敗", "unavailable": "Beanfun 無回應"}
+        lines = []
+        for e in events:
+            at = datetime.datetime.fromtimestamp(e.created_at).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            lines.append(
+                f"- {at} | **{e.app_name}** | {e.account_name} | "
+                f"{outcome_text.get(e.outcome, e.outcome)}"
+            )
+
+        await interaction.response.send_message(
+            "**最近的 API 存取紀錄：**\n" + "\n".join(lines),
+            ephemeral=True,
+        )
+
 
 async def setup(bot: commands.Bot) -> None:
     if not getattr(bot, "token_db", None):
@@ -1,6 +1,7 @@
 import asyncio
 import base64
 import datetime
+import logging
 import time
 from typing import Any, Coroutine, List
 from urllib.parse import quote
@@ -9,34 +10,160 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from exceptions.beanfun_error import BeanfunUnavailableError
 from methods.beanfun import BeanfunLogin
-from utils.config import LIMIT_GUILD, LOGIN_TIME_OUT, OTP_DISPLAY_TIME, REDIRECT_URL
+from methods.heartbeat import heartbeat_scheduler
+from methods.login_poller import login_poller
+from utils.config import (
+    LIMIT_GUILD,
+    LOGIN_TIME_OUT,
+    OTP_DISPLAY_TIME,
+    REDIRECT_URL,
+    SESSION_RESTORE_CONCURRENCY,
+)
+from utils.event_bus import SESSION_LOGIN, SESSION_LOGOUT, event_bus
 from utils.util import hidden_message
 
 import io
 
+logger = logging.getLogger("cogs.beanfun")
+
 
 class BeanfunCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.loop_list = []
+        self._restore_task = None
 
     # This method is called when the cog is loaded
     async def cog_load(self) -> Coroutine[Any, Any, None]:
+        # Bring back the sessions saved before the last shutdown
+        if getattr(self.bot, "session_store", None) is not None:
+            await self._restore_sessions()
         return await super().cog_load()
 
     # This method is called when the cog is unloaded
     async def cog_unload(self) -> Coroutine[Any, Any, None]:
-        # Cancel all loops in the loop_list
-        for i in self.loop_list:
-            i.cancel()
+        # Stop every pending QR login poll, heartbeat and auto-logout timer
+        if self._restore_task is not None:
+            self._restore_task.cancel()
+        login_poller.stop()
+        heartbeat_scheduler.stop()
+        # With a session store, keep the Beanfun sessions alive for the next start
+        if getattr(self.bot, "session_store", None) is not None:
+            # Closed entries are dropped so a reload restores them from the store
+            for channel_id, i in list(self.bot.login_dict.items()):
+                await self._save_session(i)
+                await i.close_connection()
+                if self.bot.login_dict.get(channel_id) is i:
+                    del self.bot.login_dict[channel_id]
+                    # The session is gone from this process until it is restored
+                    if i.is_login:
+                        event_bus.publish(
+                            channel_id, SESSION_LOGOUT, {"reason": "shutdown"}
+                        )
+            return await super().cog_unload()
         # Log out and close all connections in the login_dict
         for i in self.bot.login_dict.values():
-            await i.logout()
+            await i.logout(reason="shutdown")
             await i.close_connection()
 
         return await super().cog_unload()
 
+    async def _save_session(self, login: BeanfunLogin):
+        store = getattr(self.bot, "session_store", None)
+        if store is None or not login.is_login:
+            return
+        try:
+            await store.save(login.channel_id, login.export_state())
+        except Exception:
+            logger.exception("Failed to save session of channel %s", login.channel_id)
+
+    async def _forget_session(self, channel_id: int):
+        store = getattr(self.bot, "session_store", None)
+        if store is None:
+            return
+        try:
+            await store.delete(channel_id)
+        except Exception:
+            logger.exception("Failed to delete session of channel %s", channel_id)
+
+    def _heartbeat_callback(self, channel_id: int):
+        async def heartbeat_callback(status):
+            if status == -1:
+                await self._forget_session(channel_id)
+                self.bot.notifier.notify(channel_id, "被登出了:(")
+
+        return heartbeat_callback
+
+    async def _restore_sessions(self):
+        """
+        Load saved sessions into login_dict, then verify them in the background.
+
+        Restored sessions are usable right away; the first heartbeat of each one is
+        sent with bounded concurrency so a restart does not hit Beanfun all at once.
+        """
+        store = self.bot.session_store
+        restored = []
+        for channel_id, state in (await store.load_all()).items():
+            if channel_id in self.bot.login_dict:
+                continue
+            login = BeanfunLogin.from_state(state)
+            if not login.is_login:
+                await login.close_connection()
+                await store.delete(channel_id)
+                continue
+            self.bot.login_dict[channel_id] = login
+            event_bus.publish(
+                channel_id, SESSION_LOGIN, {"login_at": login.login_at, "restored": True}
+            )
+            restored.append(login)
+
+        if restored:
+            self._restore_task = asyncio.get_running_loop().create_task(
+                self._verify_restored_sessions(restored)
+            )
+
+    async def _verify_restored_sessions(self, logins: List[BeanfunLogin]):
+        semaphore = asyncio.Semaphore(SESSION_RESTORE_CONCURRENCY)
+
+        async def verify(login: BeanfunLogin):
+            async with semaphore:
+                try:
+                    heartbeat = await login.get_heartbeat()
+                except Exception:
+                    # Keep the session; the heartbeat scheduler will try again.
+                    logger.exception(
+                        "Failed to verify restored session of channel %s",
+                        login.channel_id,
+                    )
+                else:
+                    if heartbeat.ResultCode == 0:
+                        await self._forget_session(login.channel_id)
+                        return
+                await login.heartbeat_loop(self._heartbeat_callback(login.channel_id))
+
+        await asyncio.gather(*[verify(i) for i in logins])
+        logger.info(
+            "Restored %d sessions",
+            sum(1 for i in logins if i.is_login),
+        )
+
+    # Fail fast with a readable message while Beanfun endpoints are unavailable
+    async def cog_app_command_error(
+        self,
+        interaction: discord.Interaction,
+        error: app_commands.AppCommandError,
+    ) -> None:
+        original = getattr(error, "original", error)
+        # Other errors are still reported by the command tree's on_error
+        if not isinstance(original, BeanfunUnavailableError):
+            return
+        message = f"Beanfun 暫時無法連線，請於 {max(1, original.retry_after):.0f}s 後再試"
+        if interaction.response.is_done():
+            await interaction.followup.send(message)
+        else:
+            await interaction.response.send_message(message)
+
     # A command to sync the bot with the current guild
     @commands.command()
     async def sync(self, ctx: commands.Context) -> None:
@@ -58,32 +185,65 @@ class BeanfunCog(commands.Cog):
             await interaction.response.send_message("目前該頻道尚未登入BF")
             return
 
-        # Check the heartbeat of the login
-        heartbeat = await login.get_heartbeat()
+        # Acknowledge within Discord's 3s deadline; the answer follows up
+        started = time.perf_counter()
+        await interaction.response.defer(thinking=True)
+
+        # Check the (usually cached) heartbeat of the login
+        heartbeat = await login.get_cached_heartbeat()
+        heartbeat_done = time.perf_counter()
         if heartbeat.ResultCode == 0:
-            await interaction.response.send_message("帳號沒有靈壓了，需要重新登入")
+            await interaction.followup.send("帳號沒有靈壓了，需要重新登入")
             return
 
-        # Get the remaining game points of the login
-        point = await login.get_game_point()
-        # Get a list of all the accounts of the login
-        account_list_str = ""
-        for i in await login.get_maplestory_account_list():
-            account_list_str += (
-                f"帳號名稱: {i.account_name} 帳號: {hidden_message(i.account)}\n"
-            )
-        # Send the login information to the channel the command was called from
-        await interaction.response.send_message(
-            f"目前登入中，點數剩餘：{point.RemainPoint}\n{account_list_str}"
+        # Get the remaining game points and the game accounts together
+        point, account_list = await asyncio.gather(
+            login.get_game_point(), login.get_maplestory_account_list()
         )
-        await interaction.channel.send("----")  # noqa: E501
+        fetched = time.perf_counter()
+
+        await interaction.followup.send(
+            embed=self._status_embed(login, point.RemainPoint, account_list)
+        )
+        logger.info(
+            "/status in channel %s took %.0fms (heartbeat %.0fms, "
+            "points and accounts %.0fms, reply %.0fms)",
+            interaction.channel_id,
+            (time.perf_counter() - started) * 1000,
+            (heartbeat_done - started) * 1000,
+            (fetched - heartbeat_done) * 1000,
+            (time.perf_counter() - fetched) * 1000,
+        )
+
+    @staticmethod
+    def _status_embed(login: BeanfunLogin, points, account_list) -> discord.Embed:
+        embed = discord.Embed(title="目前登入中", color=discord.Color.green())
+        embed.add_field(name="點數剩餘", value=str(points))
         # Check if auto logout is set
         if login.auto_logout_sec > 0:
-            await interaction.channel.send(
-                f'設有自動登出({login.auto_logout_sec}s)，將於`{datetime.datetime.fromtimestamp(login.login_at + login.auto_logout_sec).strftime("%Y-%m-%d %H:%M:%S")}` 登出'  # noqa: E501
+            logout_at = datetime.datetime.fromtimestamp(
+                login.login_at + login.auto_logout_sec
+            ).strftime("%Y-%m-%d %H:%M:%S")
+            embed.add_field(
+                name="自動登出",
+                value=f"設有自動登出({login.auto_logout_sec}s)，將於`{logout_at}` 登出",
             )
         else:
-            await interaction.channel.send("目前沒有設定自動登出")  # noqa: E501
+            embed.add_field(name="自動登出", value="目前沒有設定自動登出")
+
+        lines = [
+            f"帳號名稱: {i.account_name} 帳號: {hidden_message(i.account)}"
+            for i in account_list
+        ]
+        description = ""
+        for shown, line in enumerate(lines):
+            # Embed descriptions are limited to 4096 characters
+            if len(description) + len(line) + 40 > 4096:
+                description += f"…還有 {len(lines) - shown} 個帳號"
+                break
+            description += line + "\n"
+        embed.description = description or "沒有遊戲帳號"
+        return embed
 
     # This is a command to login to the account
 
@@ -131,12 +291,6 @@ class BeanfunCog(commands.Cog):
             )
             delete_message_list.append(m3)
 
-        loop = asyncio.get_event_loop()
-
-        async def heartbeat_callback(status):
-            if status == -1:
-                await interaction.channel.send("被登出了:(")
-
         async def login_callback(status):
             if status == 1:
                 await interaction.channel.send("登入成功")
@@ -144,7 +298,10 @@ class BeanfunCog(commands.Cog):
 
                 login = self.bot.login_dict[interaction.channel_id]
 
-                await login.heartbeat_loop(heartbeat_callback)
+                await login.heartbeat_loop(
+                    self._heartbeat_callback(interaction.channel_id)
+                )
+                await self._save_session(login)
 
                 point = await login.get_game_point()
 
@@ -163,9 +320,7 @@ class BeanfunCog(commands.Cog):
                 await interaction.channel.send("晚了就不要了:(")
                 await asyncio.gather(*[i.delete() for i in delete_message_list])
 
-        self.loop_list.append(
-            loop.create_task(login.waiting_login_loop(login_callback))
-        )
+        await login.waiting_login_loop(login_callback)
 
     # This is a function to auto-complete game account names when the "game" command is used
     async def game_account_autocomplete(
@@ -175,20 +330,17 @@ class BeanfunCog(commands.Cog):
     ) -> List[app_commands.Choice[str]]:
         # ...
         # Retrieve the login associated with the channel ID
-        # Then return a list of game account names
+        # Then return the best matches for what has been typed so far
+        # Runs on every keystroke, so it only searches the cached account list
 
-        if interaction.channel_id not in self.bot.login_dict:
-            await interaction.response.send_message("目前該頻道沒有登入器")
-            return
-
-        login = self.bot.login_dict[interaction.channel_id]
-        if not login.is_login:
-            await interaction.response.send_message("目前該頻道尚未登入BF")
-            return
+        login = self.bot.login_dict.get(interaction.channel_id)
+        if login is None or not login.is_login:
+            return []
 
         return [
-            app_commands.Choice(name=account.account_name, value=account.account)
-            for account in (await login.get_maplestory_account_list())
+            # Discord limits choice names to 100 characters
+            app_commands.Choice(name=account.account_name[:100], value=account.account)
+            for account in login.search_accounts(current, limit=25)
         ]
 
     # This is a command to login to the game
@@ -208,15 +360,12 @@ class BeanfunCog(commands.Cog):
             await interaction.response.send_message("目前該頻道尚未登入BF")
             return
 
-        heartbeat = await login.get_heartbeat()
+        heartbeat = await login.get_cached_heartbeat()
         if heartbeat.ResultCode == 0:
             await interaction.response.send_message("帳號沒有靈壓了，需要重新登入")
             return
 
-        account_model = None
-        for i in await login.get_maplestory_account_list():
-            if i.account == game_account:
-                account_model = i
+        account_model = await login.find_account(game_account)
         if account_model is None:
             await interaction.response.send_message("! 沒找到這個帳號")
             return
@@ -246,10 +395,8 @@ class BeanfunCog(commands.Cog):
 
         login = self.bot.login_dict[interaction.channel_id]
 
-        login.auto_logout_sec = ttl
-
-        if login.is_login:
-            self.login_at = time.time()
+        login.set_auto_logout(ttl)
+        await self._save_session(login)
 
         await interaction.response.send_message(
             f"已設定為 {login.auto_logout_sec}s後登出"
@@ -271,6 +418,7 @@ class BeanfunCog(commands.Cog):
             return
 
         await login.logout()
+        await self._forget_session(interaction.channel_id)
         await interaction.response.send_message("ok")
 
     @app_commands.command(name="about", description="關於")
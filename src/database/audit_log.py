@@ -0,0 +1,220 @@
+"""
+Buffered audit log of API access (which token fetched which account's OTP).
+
+record() only appends to an in-memory buffer, so the request path never
+waits on SQLite. A background task writes the buffer in one transaction
+every `flush_interval` seconds, or as soon as `batch_size` events are
+pending. When `max_buffer` events are waiting (e.g. the disk is stuck),
+record() waits for the next flush instead of growing without bound.
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from database.pool import SQLitePool
+from database.schema import apply_migrations
+from utils.config import (
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_SEC,
+    AUDIT_MAX_BUFFER,
+)
+
+logger = logging.getLogger("database.audit_log")
+
+# Migration N is _MIGRATIONS[N - 1]; append new ones, never edit applied ones.
+_MIGRATIONS = (
+    # 1: access log with per-channel and per-token lookups, newest first
+    """
+    CREATE TABLE IF NOT EXISTS api_access_log (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at   REAL    NOT NULL,
+        channel_id   INTEGER NOT NULL,
+        token_id     INTEGER NOT NULL,
+        app_name     TEXT,
+        action       TEXT    NOT NULL,
+        account      TEXT,
+        account_name TEXT,
+        outcome      TEXT    NOT NULL,
+        remote       TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_api_access_log_channel
+        ON api_access_log (channel_id, created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_api_access_log_token
+        ON api_access_log (token_id, created_at DESC);
+    """,
+)
+
+_COLUMNS = (
+    "created_at",
+    "channel_id",
+    "token_id",
+    "app_name",
+    "action",
+    "account",
+    "account_name",
+    "outcome",
+    "remote",
+)
+
+
+class AuditEvent:
+    """One API access, either still buffered (id None) or read back from SQLite."""
+
+    __slots__ = ("id",) + _COLUMNS
+
+    def __init__(
+        self,
+        channel_id: int,
+        token_id: int,
+        action: str,
+        outcome: str,
+        app_name: Optional[str] = None,
+        account: Optional[str] = None,
+        account_name: Optional[str] = None,
+        remote: Optional[str] = None,
+        created_at: Optional[float] = None,
+        id: Optional[int] = None,
+    ):
+        self.id = id
+        self.created_at = time.time() if created_at is None else created_at
+        self.channel_id = channel_id
+        self.token_id = token_id
+        self.app_name = app_name
+        self.action = action
+        self.account = account
+        self.account_name = account_name
+        self.outcome = outcome
+        self.remote = remote
+
+    @classmethod
+    def from_row(cls, row) -> "AuditEvent":
+        return cls(id=row[0], **dict(zip(_COLUMNS, row[1:])))
+
+    def to_row(self) -> tuple:
+        return tuple(getattr(self, column) for column in _COLUMNS)
+
+
+class AuditLog:
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_SEC,
+        max_buffer: int = AUDIT_MAX_BUFFER,
+    ):
+        self._pool = SQLitePool(db_path, read_size=1)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffer = max(batch_size, max_buffer)
+        self._buffer: List[AuditEvent] = []
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self.flushed = 0
+        self.batches = 0
+        self.blocked = 0
+
+    async def init(self):
+        await self._pool.open(
+            lambda db: apply_migrations(db, "api_access_log", _MIGRATIONS)
+        )
+        self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flusher and write out whatever is still buffered."""
+        self._closing = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self._pool.close()
+
+    async def record(self, event: AuditEvent):
+        """Buffer an event; waits only while the buffer is full."""
+        if len(self._buffer) >= self._max_buffer:
+            self.blocked += 1
+            async with self._space:
+                await self._space.wait_for(
+                    lambda: len(self._buffer) < self._max_buffer or self._closing
+                )
+        self._buffer.append(event)
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write every buffered event now."""
+        async with self._flush_lock:
+            await self._flush_buffer()
+
+    async def _flush_buffer(self):
+        while self._buffer:
+            batch = self._buffer[: self._batch_size]
+            async with self._pool.writer() as db:
+                await db.executemany(
+                    f"INSERT INTO api_access_log ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    [event.to_row() for event in batch],
+                )
+            # Events recorded during the write were appended after the batch.
+            del self._buffer[: len(batch)]
+            self.flushed += len(batch)
+            self.batches += 1
+            async with self._space:
+                self._space.notify_all()
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(
+                    "Failed to flush %d audit events, retrying", len(self._buffer)
+                )
+                await asyncio.sleep(self._flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Dropped %d audit events on close", len(self._buffer))
+
+    async def recent_for_channel(
+        self, channel_id: int, limit: int = 20
+    ) -> List[AuditEvent]:
+        """Most recent access in a channel, newest first, including buffered events."""
+        return await self._recent("channel_id", channel_id, limit)
+
+    async def recent_for_token(
+        self, token_id: int, limit: int = 20
+    ) -> List[AuditEvent]:
+        """Most recent access by a token, newest first, including buffered events."""
+        return await self._recent("token_id", token_id, limit)
+
+    async def _recent(self, column: str, value: int, limit: int) -> List[AuditEvent]:
+        # Holding the flush lock keeps events from moving between the buffer
+        # and the table while both are read.
+        async with self._flush_lock:
+            pending = [e for e in self._buffer if getattr(e, column) == value]
+            rows = await self._pool.fetchall(
+                f"SELECT id, {', '.join(_COLUMNS)} FROM api_access_log "
+                f"WHERE {column} = ? ORDER BY created_at DESC LIMIT ?",
+                (value, limit),
+            )
+        events = sorted(pending, key=lambda e: e.created_at, reverse=True)
+        events += [AuditEvent.from_row(row) for row in rows]
+        return events[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "blocked": self.blocked,
+        }
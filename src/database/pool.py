@@ -0,0 +1,91 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import aiosqlite
+
+from database.schema import configure_connection
+
+
+class SQLitePool:
+    """
+    One writer connection plus a small pool of read-only connections to the
+    same WAL-mode database file.
+
+    Each aiosqlite connection runs on its own thread, so reads on different
+    pooled connections proceed in parallel, and with WAL they do not wait for
+    the writer. Writes are serialized through the single writer connection;
+    each `writer()` block is one transaction.
+    """
+
+    def __init__(self, db_path: str, read_size: int):
+        self._db_path = db_path
+        self._read_size = max(1, read_size)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._all_readers = []
+
+    async def open(
+        self,
+        migrate: Optional[Callable[[aiosqlite.Connection], Awaitable]] = None,
+    ):
+        """
+        Open the writer, run `migrate` on it, then open the readers.
+
+        Args:
+            migrate (callable, optional): Brings the schema up to date before any read.
+        """
+        directory = os.path.dirname(self._db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = await aiosqlite.connect(self._db_path)
+        await configure_connection(self._writer)
+        if migrate is not None:
+            await migrate(self._writer)
+
+        for _ in range(self._read_size):
+            reader = await aiosqlite.connect(self._db_path)
+            await configure_connection(reader)
+            await reader.execute("PRAGMA query_only = ON")
+            self._all_readers.append(reader)
+            self._readers.put_nowait(reader)
+
+    async def close(self):
+        for reader in self._all_readers:
+            await reader.close()
+        self._all_readers.clear()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection, waiting while all of them are busy."""
+        connection = await self._readers.get()
+        try:
+            yield connection
+        finally:
+            self._readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Hold the writer for one transaction, committed on success."""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+    async def fetchone(self, sql: str, params=()) -> Optional[aiosqlite.Row]:
+        async with self.reader() as db:
+            cursor = await db.execute(sql, params)
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params=()) -> list:
+        async with self.reader() as db:
+            cursor = await db.execute(sql, params)
+            return await cursor.fetchall()
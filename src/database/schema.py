@@ -0,0 +1,89 @@
+"""
+Connection settings and versioned migrations shared by the SQLite stores.
+
+Migrations are a list of SQL scripts; the number already applied is kept in
+PRAGMA user_version, and each pending script runs in its own transaction
+together with the version bump.
+"""
+
+import logging
+from typing import Sequence
+
+import aiosqlite
+
+logger = logging.getLogger("database.schema")
+
+_CONNECTION_PRAGMAS = (
+    # WAL lets readers proceed while a write is in progress.
+    "PRAGMA journal_mode = WAL",
+    # Safe with WAL: a power loss can only drop the latest commits.
+    "PRAGMA synchronous = NORMAL",
+    # Negative values are KiB.
+    "PRAGMA cache_size = -8000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+async def configure_connection(db: aiosqlite.Connection):
+    """Apply the journal, sync and cache settings to a new connection."""
+    for pragma in _CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+
+
+async def apply_migrations(
+    db: aiosqlite.Connection, name: str, migrations: Sequence[str]
+) -> int:
+    """
+    Bring the database up to `len(migrations)`.
+
+    Args:
+        db (aiosqlite.Connection): The connection to migrate.
+        name (str): Store name used in log messages.
+        migrations (Sequence[str]): SQL scripts, migration N being migrations[N - 1].
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    cursor = await db.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    if version > len(migrations):
+        raise RuntimeError(
+            f"{name} schema version {version} is newer than this code "
+            f"({len(migrations)})"
+        )
+
+    for target, script in enumerate(migrations[version:], start=version + 1):
+        logger.info("Migrating %s schema to version %d", name, target)
+        await db.executescript(
+            f"BEGIN;\n{script}\nPRAGMA user_version = {target};\nCOMMIT;"
+        )
+    return len(migrations)
+
+
+async def enable_incremental_vacuum(db: aiosqlite.Connection):
+    """
+    Switch the database to auto_vacuum=INCREMENTAL so freed pages can be
+    returned to the OS with incremental_vacuum. An existing database needs a
+    one-time VACUUM for the change to take effect.
+    """
+    cursor = await db.execute("PRAGMA auto_vacuum")
+    (mode,) = await cursor.fetchone()
+    if mode == 2:
+        return
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    await db.execute("VACUUM")
+
+
+async def incremental_vacuum(db: aiosqlite.Connection, max_pages: int) -> int:
+    """Release up to `max_pages` free pages. Returns how many were freed."""
+    cursor = await db.execute("PRAGMA freelist_count")
+    (before,) = await cursor.fetchone()
+    if not before:
+        return 0
+    # The pragma frees one page per step, so it has to be read to the end.
+    cursor = await db.execute(f"PRAGMA incremental_vacuum({int(max_pages)})")
+    await cursor.fetchall()
+    cursor = await db.execute("PRAGMA freelist_count")
+    (after,) = await cursor.fetchone()
+    return before - after
@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import secrets
+import time
+from typing import Dict, Optional
+
+import aiosqlite
+from Crypto.Cipher import AES
+
+from database.schema import apply_migrations
+
+# Migration N is _MIGRATIONS[N - 1]; append new ones, never edit applied ones.
+_MIGRATIONS = (
+    # 1: encrypted session state per channel
+    """
+    CREATE TABLE IF NOT EXISTS beanfun_sessions (
+        channel_id INTEGER PRIMARY KEY,
+        payload    BLOB    NOT NULL,
+        updated_at REAL    NOT NULL
+    );
+    """,
+    # 2: store-wide settings, e.g. the key derivation salt
+    """
+    CREATE TABLE IF NOT EXISTS store_meta (
+        name  TEXT PRIMARY KEY,
+        value BLOB NOT NULL
+    );
+    """,
+)
+
+_NONCE_SIZE = 12
+_TAG_SIZE = 16
+_SALT_SIZE = 16
+
+# scrypt cost: about 32 MiB and a fraction of a second, paid once at startup.
+_SCRYPT_N = 2**15
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+_SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+
+def derive_key(secret: str, salt: bytes) -> bytes:
+    """Stretch a passphrase into a 256-bit key with scrypt."""
+    return hashlib.scrypt(
+        secret.encode(),
+        salt=salt,
+        n=_SCRYPT_N,
+        r=_SCRYPT_R,
+        p=_SCRYPT_P,
+        maxmem=_SCRYPT_MAXMEM,
+        dklen=32,
+    )
+
+
+def load_or_create_key(db_path: str) -> bytes:
+    """
+    Returns the random 256-bit key kept in `<db_path>.key`, created with
+    owner-only permissions on first use.
+    """
+    key_path = f"{db_path}.key"
+    if os.path.exists(key_path):
+        with open(key_path, "rb") as f:
+            return base64.b64decode(f.read())
+
+    key = secrets.token_bytes(32)
+    directory = os.path.dirname(key_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(base64.b64encode(key))
+    return key
+
+
+class SessionStore:
+    """
+    AES-GCM encrypted SQLite store of BeanfunLogin state, keyed by channel id.
+
+    The key is derived from `secret` with scrypt and a random salt kept in the
+    store. Without a secret, a random key file next to the database is used.
+    """
+
+    def __init__(self, db_path: str, secret: Optional[str] = None):
+        self._db_path = db_path
+        self._secret = secret
+        self._key: Optional[bytes] = None
+        self._db: Optional[aiosqlite.Connection] = None
+
+    async def init(self):
+        directory = os.path.dirname(self._db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = await aiosqlite.connect(self._db_path)
+        await apply_migrations(self._db, "beanfun_sessions", _MIGRATIONS)
+        if self._secret:
+            salt = await self._load_or_create_salt()
+            # scrypt is deliberately slow, so keep it off the event loop.
+            self._key = await asyncio.to_thread(derive_key, self._secret, salt)
+        else:
+            self._key = load_or_create_key(self._db_path)
+
+    async def _load_or_create_salt(self) -> bytes:
+        await self._db.execute(
+            "INSERT OR IGNORE INTO store_meta (name, value) VALUES ('salt', ?)",
+            (secrets.token_bytes(_SALT_SIZE),),
+        )
+        await self._db.commit()
+        cursor = await self._db.execute(
+            "SELECT value FROM store_meta WHERE name = 'salt'"
+        )
+        (salt,) = await cursor.fetchone()
+        return salt
+
+    async def close(self):
+        if self._db:
+            await self._db.close()
+
+    def _encrypt(self, state: dict) -> bytes:
+        nonce = secrets.token_bytes(_NONCE_SIZE)
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        ciphertext, tag = cipher.encrypt_and_digest(
+            json.dumps(state, ensure_ascii=False).encode()
+        )
+        return nonce + tag + ciphertext
+
+    def _decrypt(self, payload: bytes) -> dict:
+        header = _NONCE_SIZE + _TAG_SIZE
+        nonce, tag, ciphertext = (
+            payload[:_NONCE_SIZE],
+            payload[_NONCE_SIZE:header],
+            payload[header:],
+        )
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        data = cipher.decrypt_and_verify(ciphertext, tag)
+        return json.loads(data)
+
+    async def save(self, channel_id: int, state: dict):
+        """Insert or replace the state of a channel."""
+        await self._db.execute(
+            """
+            INSERT OR REPLACE INTO beanfun_sessions (channel_id, payload, updated_at)
+            VALUES (?, ?, ?)
+            """,
+            (channel_id, self._encrypt(state), time.time()),
+        )
+        await self._db.commit()
+
+    async def delete(self, channel_id: int):
+        await self._db.execute(
+            "DELETE FROM beanfun_sessions WHERE channel_id = ?", (channel_id,)
+        )
+        await self._db.commit()
+
+    async def load_all(self) -> Dict[int, dict]:
+        """
+        Load every stored state. Rows that fail to decrypt (e.g. after a key change)
+        are skipped.
+        """
+        cursor = await self._db.execute(
+            "SELECT channel_id, payload FROM beanfun_sessions"
+        )
+        result = {}
+        for channel_id, payload in await cursor.fetchall():
+            try:
+                result[channel_id] = self._decrypt(payload)
+            except (ValueError, KeyError):
+                continue
+        return result
@@ -1,26 +1,112 @@
-import os
+import asyncio
+import logging
 import secrets
 import time
-from typing import Optional
+from typing import Dict, Optional
 
 import aiosqlite
 
-_CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS api_tokens (
-    id               INTEGER PRIMARY KEY AUTOINCREMENT,
-    token            TEXT    UNIQUE NOT NULL,
-    app_name         TEXT    NOT NULL,
-    channel_id       INTEGER NOT NULL,
-    channel_name     TEXT,
-    discord_user_id  INTEGER NOT NULL,
-    discord_username TEXT,
-    created_at       REAL    NOT NULL,
-    expires_at       REAL,
-    revoked          INTEGER DEFAULT 0,
-    revoked_at       REAL
-);
+from database.pool import SQLitePool
+from database.schema import (
+    apply_migrations,
+    enable_incremental_vacuum,
+    incremental_vacuum,
+)
+from utils.cache import LRUCache
+from utils.config import (
+    DB_READ_POOL_SIZE,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL_SEC,
+    TOKEN_NEGATIVE_CACHE_SEC,
+    TOKEN_RETENTION_SEC,
+    TOKEN_SWEEP_ARCHIVE,
+    TOKEN_SWEEP_BATCH,
+    TOKEN_SWEEP_INTERVAL_SEC,
+)
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger("database.token_db")
+
+# Migration N is _MIGRATIONS[N - 1]; append new ones, never edit applied ones.
+_MIGRATIONS = (
+    # 1: initial table
+    """
+    CREATE TABLE IF NOT EXISTS api_tokens (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        token            TEXT    UNIQUE NOT NULL,
+        app_name         TEXT    NOT NULL,
+        channel_id       INTEGER NOT NULL,
+        channel_name     TEXT,
+        discord_user_id  INTEGER NOT NULL,
+        discord_username TEXT,
+        created_at       REAL    NOT NULL,
+        expires_at       REAL,
+        revoked          INTEGER DEFAULT 0,
+        revoked_at       REAL
+    );
+    """,
+    # 2: partial indexes for list_tokens / list_user_tokens, which only
+    # ever read active tokens newest first.
+    """
+    CREATE INDEX IF NOT EXISTS idx_api_tokens_channel_active
+        ON api_tokens (channel_id, created_at DESC) WHERE revoked = 0;
+    CREATE INDEX IF NOT EXISTS idx_api_tokens_channel_user_active
+        ON api_tokens (channel_id, discord_user_id, created_at DESC)
+        WHERE revoked = 0;
+    """,
+    # 3: lookups for the expiry sweeper and the archive it moves rows to
+    """
+    CREATE INDEX IF NOT EXISTS idx_api_tokens_expires_at
+        ON api_tokens (expires_at) WHERE expires_at IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_api_tokens_revoked_at
+        ON api_tokens (revoked_at) WHERE revoked = 1;
+    CREATE TABLE IF NOT EXISTS api_tokens_archive (
+        id               INTEGER PRIMARY KEY,
+        token            TEXT    NOT NULL,
+        app_name         TEXT    NOT NULL,
+        channel_id       INTEGER NOT NULL,
+        channel_name     TEXT,
+        discord_user_id  INTEGER NOT NULL,
+        discord_username TEXT,
+        created_at       REAL    NOT NULL,
+        expires_at       REAL,
+        revoked          INTEGER DEFAULT 0,
+        revoked_at       REAL,
+        archived_at      REAL    NOT NULL
+    );
+    """,
+    # 4: per-app OTP rate limit overrides, NULL meaning the configured default
+    """
+    ALTER TABLE api_tokens ADD COLUMN otp_rate_per_min REAL;
+    ALTER TABLE api_tokens ADD COLUMN otp_burst INTEGER;
+    ALTER TABLE api_tokens_archive ADD COLUMN otp_rate_per_min REAL;
+    ALTER TABLE api_tokens_archive ADD COLUMN otp_burst INTEGER;
+    """,
+    # 5: list_tokens / list_user_tokens also skip expired tokens; with
+    # expires_at in the index, expired entries are skipped without a row read.
+    """
+    DROP INDEX IF EXISTS idx_api_tokens_channel_active;
+    DROP INDEX IF EXISTS idx_api_tokens_channel_user_active;
+    CREATE INDEX idx_api_tokens_channel_active
+        ON api_tokens (channel_id, created_at DESC, expires_at) WHERE revoked = 0;
+    CREATE INDEX idx_api_tokens_channel_user_active
+        ON api_tokens (channel_id, discord_user_id, created_at DESC, expires_at)
+        WHERE revoked = 0;
+    """,
+)
+
+_SWEEP_SELECT_SQL = """
+SELECT id FROM api_tokens WHERE revoked = 1 AND revoked_at < :cutoff
+UNION
+SELECT id FROM api_tokens WHERE expires_at < :cutoff
+LIMIT :limit
 """
 
+# Free pages released per incremental_vacuum step, so one step stays short.
+_VACUUM_PAGES = 256
+
+_MISSING = object()
+
 
 class TokenRecord:
     """Lightweight wrapper around a row from api_tokens."""
@@ -37,6 +123,8 @@ class TokenRecord:
         "expires_at",
         "revoked",
         "revoked_at",
+        "otp_rate_per_min",
+        "otp_burst",
     )
 
     def __init__(self, row: aiosqlite.Row):
@@ -52,23 +140,72 @@ class TokenRecord:
             self.expires_at,
             self.revoked,
             self.revoked_at,
+            self.otp_rate_per_min,
+            self.otp_burst,
         ) = row
 
 
 class TokenDatabase:
-    def __init__(self, db_path: str):
+    """
+    SQLite store of API tokens.
+
+    Validated tokens are cached in a bounded LRU for up to `cache_ttl` seconds
+    (never past their own expiry) and unknown/invalid tokens for
+    `negative_cache_ttl` seconds. Concurrent lookups of the same uncached token
+    share one query, and revoke_token drops the token from the cache at once.
+
+    Reads go to a pool of `read_pool_size` connections and writes to a single
+    writer connection (see SQLitePool).
+
+    Every `sweep_interval` seconds a background task removes tokens that were
+    revoked or expired more than `retention` seconds ago (see sweep()).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        cache_size: int = TOKEN_CACHE_SIZE,
+        cache_ttl: float = TOKEN_CACHE_TTL_SEC,
+        negative_cache_ttl: float = TOKEN_NEGATIVE_CACHE_SEC,
+        read_pool_size: int = DB_READ_POOL_SIZE,
+        retention: float = TOKEN_RETENTION_SEC,
+        sweep_interval: float = TOKEN_SWEEP_INTERVAL_SEC,
+        sweep_batch: int = TOKEN_SWEEP_BATCH,
+        archive: bool = TOKEN_SWEEP_ARCHIVE,
+    ):
         self._db_path = db_path
-        self._db: Optional[aiosqlite.Connection] = None
+        self._pool = SQLitePool(db_path, read_pool_size)
+        self._cache: LRUCache[Optional[TokenRecord]] = LRUCache(cache_size)
+        self._cache_ttl = cache_ttl
+        self._negative_cache_ttl = negative_cache_ttl
+        self._lookups = SingleFlight()
+        # Bumped by every token update so a lookup racing it cannot cache a
+        # stale record.
+        self._changes = 0
+        self._retention = retention
+        self._sweep_interval = sweep_interval
+        self._sweep_batch = sweep_batch
+        self._archive = archive
+        self._sweeper: Optional[asyncio.Task] = None
 
     async def init(self):
-        os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
-        self._db = await aiosqlite.connect(self._db_path)
-        await self._db.execute(_CREATE_TABLE_SQL)
-        await self._db.commit()
+        await self._pool.open(self._migrate)
+        if self._sweep_interval > 0:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def _migrate(self, db: aiosqlite.Connection):
+        await enable_incremental_vacuum(db)
+        await apply_migrations(db, "api_tokens", _MIGRATIONS)
 
     async def close(self):
-        if self._db:
-            await self._db.close()
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self._pool.close()
 
     async def create_token(
         self,
@@ -86,87 +223,205 @@ class TokenDatabase:
         if expires_in_seconds is not None and expires_in_seconds > 0:
             expires_at = now + expires_in_seconds
 
-        await self._db.execute(
-            """
-            INSERT INTO api_tokens
-                (token, app_name, channel_id, channel_name,
-                 discord_user_id, discord_username, created_at, expires_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                token,
-                app_name,
-                channel_id,
-                channel_name,
-                discord_user_id,
-                discord_username,
-                now,
-                expires_at,
-            ),
-        )
-        await self._db.commit()
+        async with self._pool.writer() as db:
+            await db.execute(
+                """
+                INSERT INTO api_tokens
+                    (token, app_name, channel_id, channel_name,
+                     discord_user_id, discord_username, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    token,
+                    app_name,
+                    channel_id,
+                    channel_name,
+                    discord_user_id,
+                    discord_username,
+                    now,
+                    expires_at,
+                ),
+            )
+        self._cache.pop(token)
         return token
 
     async def validate_token(self, token: str) -> Optional[TokenRecord]:
         """Validate a token. Returns TokenRecord if valid, None otherwise."""
-        cursor = await self._db.execute(
+        record = self._cache.get(token, _MISSING)
+        if record is _MISSING:
+            record = await self._lookups.do(token, lambda: self._load_token(token))
+        if record is not None and record.expires_at is not None:
+            if time.time() > record.expires_at:
+                return None
+        return record
+
+    async def _load_token(self, token: str) -> Optional[TokenRecord]:
+        changes = self._changes
+        row = await self._pool.fetchone(
             "SELECT * FROM api_tokens WHERE token = ?", (token,)
         )
-        row = await cursor.fetchone()
-        if row is None:
-            return None
+        record = TokenRecord(row) if row is not None else None
 
-        record = TokenRecord(row)
-        if record.revoked:
-            return None
-        if record.expires_at is not None and time.time() > record.expires_at:
+        now = time.time()
+        if (
+            record is None
+            or record.revoked
+            or (record.expires_at is not None and now > record.expires_at)
+        ):
+            self._cache.set(token, None, self._negative_cache_ttl)
             return None
+
+        if changes == self._changes:
+            ttl = self._cache_ttl
+            if record.expires_at is not None:
+                ttl = min(ttl, record.expires_at - now)
+            self._cache.set(token, record, ttl)
         return record
 
+    def cache_stats(self) -> dict:
+        return {**self._cache.stats(), **self._lookups.stats()}
+
     async def list_tokens(self, channel_id: int) -> list[TokenRecord]:
-        """List all non-revoked tokens for a channel."""
-        cursor = await self._db.execute(
+        """List all active (non-revoked, unexpired) tokens for a channel."""
+        rows = await self._pool.fetchall(
             """
             SELECT * FROM api_tokens
             WHERE channel_id = ? AND revoked = 0
+              AND (expires_at IS NULL OR expires_at > ?)
             ORDER BY created_at DESC
             """,
-            (channel_id,),
+            (channel_id, time.time()),
         )
-        rows = await cursor.fetchall()
         return [TokenRecord(r) for r in rows]
 
     async def list_user_tokens(
         self, channel_id: int, discord_user_id: int
     ) -> list[TokenRecord]:
-        """List all non-revoked tokens for a user in a channel."""
-        cursor = await self._db.execute(
+        """List all active (non-revoked, unexpired) tokens for a user in a channel."""
+        rows = await self._pool.fetchall(
             """
             SELECT * FROM api_tokens
             WHERE channel_id = ? AND discord_user_id = ? AND revoked = 0
+              AND (expires_at IS NULL OR expires_at > ?)
             ORDER BY created_at DESC
             """,
-            (channel_id, discord_user_id),
+            (channel_id, discord_user_id, time.time()),
         )
-        rows = await cursor.fetchall()
         return [TokenRecord(r) for r in rows]
 
     async def revoke_token(self, token_id: int) -> bool:
         """Revoke a token by its ID. Returns True if updated."""
-        cursor = await self._db.execute(
-            """
-            UPDATE api_tokens
-            SET revoked = 1, revoked_at = ?
-            WHERE id = ? AND revoked = 0
-            """,
-            (time.time(), token_id),
-        )
-        await self._db.commit()
+        async with self._pool.writer() as db:
+            cursor = await db.execute(
+                """
+                UPDATE api_tokens
+                SET revoked = 1, revoked_at = ?
+                WHERE id = ? AND revoked = 0
+                """,
+                (time.time(), token_id),
+            )
+        self._forget(token_id)
         return cursor.rowcount > 0
 
+    async def set_otp_rate_limit(
+        self, token_id: int, per_minute: Optional[float], burst: Optional[int]
+    ) -> bool:
+        """
+        Override the OTP rate limit of one app (token). None restores the default.
+
+        Returns:
+            bool: True if an active token was updated.
+        """
+        async with self._pool.writer() as db:
+            cursor = await db.execute(
+                """
+                UPDATE api_tokens
+                SET otp_rate_per_min = ?, otp_burst = ?
+                WHERE id = ? AND revoked = 0
+                """,
+                (per_minute, burst, token_id),
+            )
+        self._forget(token_id)
+        return cursor.rowcount > 0
+
+    def _forget(self, token_id: int):
+        """Drop a changed token from the cache, including lookups in flight."""
+        self._changes += 1
+        self._cache.discard_where(
+            lambda record: record is not None and record.id == token_id
+        )
+
     async def get_token_by_id(self, token_id: int) -> Optional[TokenRecord]:
-        cursor = await self._db.execute(
+        row = await self._pool.fetchone(
             "SELECT * FROM api_tokens WHERE id = ?", (token_id,)
         )
-        row = await cursor.fetchone()
         return TokenRecord(row) if row else None
+
+    async def sweep(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Remove tokens revoked or expired more than the retention window ago.
+
+        Rows are moved to api_tokens_archive (or deleted when archiving is off)
+        in batches of `sweep_batch`, one short write transaction each, so other
+        writers are never held up for long. Freed pages are then released with
+        incremental_vacuum, also in small steps.
+
+        Returns:
+            Dict[str, int]: Rows removed and pages released.
+        """
+        cutoff = (time.time() if now is None else now) - self._retention
+        removed = 0
+        while True:
+            async with self._pool.writer() as db:
+                cursor = await db.execute(
+                    _SWEEP_SELECT_SQL, {"cutoff": cutoff, "limit": self._sweep_batch}
+                )
+                ids = [row[0] for row in await cursor.fetchall()]
+                if not ids:
+                    break
+                placeholders = ", ".join("?" * len(ids))
+                if self._archive:
+                    columns = ", ".join(TokenRecord.__slots__)
+                    await db.execute(
+                        f"""
+                        INSERT OR REPLACE INTO api_tokens_archive
+                            ({columns}, archived_at)
+                        SELECT {columns}, ? FROM api_tokens
+                        WHERE id IN ({placeholders})
+                        """,
+                        (time.time(), *ids),
+                    )
+                await db.execute(
+                    f"DELETE FROM api_tokens WHERE id IN ({placeholders})", ids
+                )
+            removed += len(ids)
+            if len(ids) < self._sweep_batch:
+                break
+            # Let queued writes in between batches.
+            await asyncio.sleep(0)
+
+        pages = 0
+        if removed:
+            while True:
+                async with self._pool.writer() as db:
+                    freed = await incremental_vacuum(db, _VACUUM_PAGES)
+                pages += freed
+                if freed < _VACUUM_PAGES:
+                    break
+                await asyncio.sleep(0)
+        return {"removed": removed, "pages_freed": pages}
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            try:
+                result = await self.sweep()
+            except Exception:
+                logger.exception("Token sweep failed")
+                continue
+            if result["removed"]:
+                logger.info(
+                    "Swept %d revoked/expired tokens, freed %d pages",
+                    result["removed"],
+                    result["pages_freed"],
+                )
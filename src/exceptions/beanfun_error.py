@@ -1,5 +1,25 @@
+from typing import Optional
 
 
 class LoginTimeOutError(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
+
+
+class BeanfunUnavailableError(Exception):
+    """
+    Raised without sending a request while an endpoint's circuit breaker is open,
+    or when the endpoint still answers with a 5xx after every retry (`status`).
+    """
+
+    def __init__(
+        self, endpoint: str, retry_after: float, status: Optional[int] = None
+    ) -> None:
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        self.status = status
+        if status is None:
+            message = f"{endpoint} is unavailable, retry in {retry_after:.0f}s"
+        else:
+            message = f"{endpoint} answered HTTP {status}"
+        super().__init__(message)
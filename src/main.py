@@ -2,11 +2,22 @@ import os
 import asyncio
 from discord.ext import commands
 import discord
-from utils.config import BOT_TOKEN, FEAT_APP_SERVER, API_PORT, DB_PATH
+from utils.config import (
+    BOT_TOKEN,
+    FEAT_APP_SERVER,
+    API_PORT,
+    AUDIT_DB_PATH,
+    DB_PATH,
+    FEAT_SESSION_STORE,
+    SESSION_STORE_KEY,
+    SESSION_STORE_PATH,
+)
+from utils.notifier import NotificationDispatcher
 
 intents = discord.Intents.all()
 bot = commands.Bot(command_prefix=".", intents=intents)
 bot.login_dict = {}
+bot.notifier = NotificationDispatcher(bot)
 
 
 @bot.event
@@ -42,25 +53,58 @@ async def main():
     if BOT_TOKEN is None:
         raise ValueError("Not found BOT_TOKEN")
 
-    async with bot:
-        if FEAT_APP_SERVER:
-            from database.token_db import TokenDatabase
-            from api.server import create_api_app
-            from aiohttp import web
-
-            db = TokenDatabase(DB_PATH)
-            await db.init()
-            bot.token_db = db
-
-            app = create_api_app(bot, db)
-            runner = web.AppRunner(app)
-            await runner.setup()
-            site = web.TCPSite(runner, "0.0.0.0", API_PORT)
-            await site.start()
-            print(f"API server started on port {API_PORT}")
-
-        await load_extensions()
-        await bot.start(BOT_TOKEN)
+    try:
+        async with bot:
+            try:
+                await _run_bot()
+            finally:
+                # Flush queued notices while the bot can still send them.
+                await bot.notifier.close()
+    finally:
+        # Cogs are unloaded when the bot closes, so shared resources go last.
+        from methods.transport import close_transport
+
+        if getattr(bot, "session_store", None):
+            await bot.session_store.close()
+        if getattr(bot, "audit_log", None):
+            await bot.audit_log.close()
+        if getattr(bot, "token_db", None):
+            await bot.token_db.close()
+        await close_transport()
+
+
+async def _run_bot():
+    if FEAT_SESSION_STORE:
+        from database.session_store import SessionStore
+
+        store = SessionStore(SESSION_STORE_PATH, secret=SESSION_STORE_KEY)
+        await store.init()
+        bot.session_store = store
+
+    if FEAT_APP_SERVER:
+        from database.audit_log import AuditLog
+        from database.token_db import TokenDatabase
+        from api.rate_limit import ApiRateLimiter
+        from api.server import create_api_app
+        from aiohttp import web
+
+        db = TokenDatabase(DB_PATH)
+        await db.init()
+        bot.token_db = db
+
+        audit_log = AuditLog(AUDIT_DB_PATH)
+        await audit_log.init()
+        bot.audit_log = audit_log
+
+        app = create_api_app(bot, db, audit_log, ApiRateLimiter())
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "0.0.0.0", API_PORT)
+        await site.start()
+        print(f"API server started on port {API_PORT}")
+
+    await load_extensions()
+    await bot.start(BOT_TOKEN)
 
 
 if __name__ == "__main__":
@@ -1,15 +1,37 @@
 import asyncio
 import json
+from http.cookies import SimpleCookie
+import logging
 import re
 import time
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import aiohttp
 from lxml import etree
-
-from exceptions.beanfun_error import LoginTimeOutError
-from utils.config import LOGIN_TIME_OUT
+from yarl import URL
+
+from exceptions.beanfun_error import BeanfunUnavailableError, LoginTimeOutError
+from methods.heartbeat import heartbeat_scheduler
+from methods.login_poller import login_poller
+from methods.resilience import resilient_request
+from methods.transport import create_session, get_host_limiter
+from utils.account_index import AccountIndex
+from utils.cache import CachedValue
+from utils.config import (
+    ACCOUNT_LIST_TTL_SEC,
+    BEANFUN_BASE_URL,
+    HEARTBEAT_CACHE_SEC,
+    LOGIN_TIME_OUT,
+    OTP_SESSION_CONCURRENCY,
+)
+from utils.event_bus import (
+    ACCOUNT_LIST_CHANGED,
+    ACCOUNT_LIST_STALE,
+    SESSION_HEARTBEAT_LOST,
+    SESSION_LOGIN,
+    SESSION_LOGOUT,
+    event_bus,
+)
 from utils.model import (
     CheckLoginStatus,
     GamePointResponse,
@@ -17,32 +39,60 @@ from utils.model import (
     LoginQRInfo,
     MSAccountModel,
 )
-from utils.util import SSL_CTX, decrypt_des_pkcs5_hex, extract_json
+from utils.singleflight import SingleFlight
+from utils.util import decrypt_des_pkcs5_hex, extract_json
+
+logger = logging.getLogger("methods.beanfun")
 
 
 class BeanfunLogin:
-    def __init__(self, channel_id, auto_logout_sec: int = -1) -> None:
+    def __init__(
+        self,
+        channel_id,
+        auto_logout_sec: int = -1,
+        base_url: Optional[str] = BEANFUN_BASE_URL,
+    ) -> None:
         """
         Initialize a BeanfunLogin object.
 
         Args:
             channel_id (str): Channel ID for the login.
             auto_logout_sec (int, optional): Auto-logout timeout in seconds. Defaults to -1, meaning no auto-logout.
+            base_url (str, optional): Send every Beanfun request to this origin instead, e.g. a local
+                stand-in server. Defaults to BEANFUN_BASE_URL.
         """
         self.channel_id = channel_id
+        self.base_url = base_url.rstrip("/") if base_url else None
         self.is_login = False
         self.login_qr_data = None
         self.web_token = None
         self._create_login_time = 0
         self.skey = None
-        self.game_account_list = None
+        self._account_cache: CachedValue[List[MSAccountModel]] = CachedValue(
+            ACCOUNT_LIST_TTL_SEC, on_set=self._watch_account_list
+        )
+        self._heartbeat_cache: CachedValue[HeartBeatResponse] = CachedValue(
+            HEARTBEAT_CACHE_SEC
+        )
+        self._secret_code: Optional[str] = None
+        self._account_index: Optional[AccountIndex] = None
+        # Account id -> when its OTP was last fetched, to rank autocomplete.
+        self._account_used: Dict[str, float] = {}
+        # (account, account_name) pairs last announced on the event bus.
+        self._announced_accounts: Optional[List[Tuple[str, str]]] = None
+        # Fires when the cached account list goes stale, see _watch_account_list.
+        self._account_stale_timer: Optional[asyncio.TimerHandle] = None
+        # Concurrent identical reads share one upstream request.
+        self._flight = SingleFlight()
+        # Bounds the OTP requests this session has in flight, e.g. from a batch.
+        self._otp_slots = asyncio.Semaphore(OTP_SESSION_CONCURRENCY)
+        self.last_otp_timings: Dict[str, float] = {}
         self.login_at = 0
         self.auto_logout_sec = auto_logout_sec
-        self.heartbeat_worker = None
 
-        # Setting up the TCP connection for the session.
-        self._conn = aiohttp.TCPConnector(ssl=SSL_CTX)
-        self.session = aiohttp.ClientSession(connector=self._conn)
+        # The connection pool is shared process-wide; cookies stay per channel.
+        # Stand-in servers usually run on an IP address, whose cookies aiohttp drops by default.
+        self.session = create_session(unsafe_cookies=self.base_url is not None)
 
         self.proxy = None 
 
@@ -51,10 +101,30 @@ class BeanfunLogin:
         async def request_with_proxy(method, url, **kwargs):
             if self.proxy and "proxy" not in kwargs:
                 kwargs["proxy"] = self.proxy
-            return await original_request(method, url, **kwargs)
+            limiter = get_host_limiter(URL(url).host)
+
+            async def send(timeout):
+                # Every attempt waits for a fair share of its host's rate and concurrency budget.
+                async with limiter.slot(self.channel_id):
+                    return await original_request(
+                        method, url, **{"timeout": timeout, **kwargs}
+                    )
+
+            return await resilient_request(method, url, send)
 
         self.session._request = request_with_proxy
 
+    def _url(self, url: str) -> str:
+        """Points a Beanfun URL at `base_url` when one is configured."""
+        if self.base_url is None:
+            return url
+        return re.sub(r"^https://[^/]+", self.base_url, url)
+
+    @property
+    def qr_created_at(self) -> float:
+        """Timestamp at which the current login QR code was created."""
+        return self._create_login_time
+
     async def get_login_info(self) -> LoginQRInfo:
         """
         Retrieves the login info, including QR image and DeepLink.
@@ -70,16 +140,20 @@ class BeanfunLogin:
         res = await self.session.get(
             # WTF m.beanfun.com can, but tw.beanfun.com can't use.
             # "https://tw.beanfun.com/beanfun_block/bflogin/default.aspx?service_code=999999&service_region=T0",
-            "https://m.beanfun.com/bflogin/Index?service=999999_T0&url=https%3A//m.beanfun.com/",
+            self._url(
+                "https://m.beanfun.com/bflogin/Index?service=999999_T0&url=https%3A//m.beanfun.com/"
+            ),
         )
         self.skey = res.request_info.url.query.get("skey")
 
         res = await self.session.get(
-            f"https://tw.newlogin.beanfun.com/checkin.aspx?skey={self.skey}&display_mode=5"
+            self._url(
+                f"https://tw.newlogin.beanfun.com/checkin.aspx?skey={self.skey}&display_mode=5"
+            )
         )
 
         res = await self.session.get(
-            f"https://login.beanfun.com/Login/Index?pSKey={self.skey}",
+            self._url(f"https://login.beanfun.com/Login/Index?pSKey={self.skey}"),
             headers={"Referer": "https://tw.newlogin.beanfun.com/"},
         )
         html = await res.text()
@@ -91,7 +165,7 @@ class BeanfunLogin:
         self._verification_token = match.group(1)
 
         res = await self.session.get(
-            "https://login.beanfun.com/Login/InitLogin",
+            self._url("https://login.beanfun.com/Login/InitLogin"),
             headers={
                 "Accept": "application/json, text/plain, */*",
                 "RequestVerificationToken": self._verification_token,
@@ -129,20 +203,20 @@ class BeanfunLogin:
         }
 
         res = await self.session.post(
-            "https://login.beanfun.com/QRLogin/CheckLoginStatus",
+            self._url("https://login.beanfun.com/QRLogin/CheckLoginStatus"),
             headers=_login_index_headers,
         )
         response = CheckLoginStatus(**(await res.json()))
         if response.ResultCode == 1:
             # QRLogin → 取得 bfSecretCode cookie
             await self.session.get(
-                "https://login.beanfun.com/QRLogin/QRLogin",
+                self._url("https://login.beanfun.com/QRLogin/QRLogin"),
                 headers=_login_index_headers,
             )
 
             # SendLogin → 解析 AuthKey / SessionKey
             res = await self.session.get(
-                "https://login.beanfun.com/Login/SendLogin",
+                self._url("https://login.beanfun.com/Login/SendLogin"),
                 headers={
                     "Referer": f"https://login.beanfun.com/Login/Index?pSKey={self.skey}",
                 },
@@ -160,7 +234,7 @@ class BeanfunLogin:
 
             # POST return.aspx
             res = await self.session.post(
-                "https://tw.beanfun.com/beanfun_block/bflogin/return.aspx",
+                self._url("https://tw.beanfun.com/beanfun_block/bflogin/return.aspx"),
                 data={
                     "AuthKey": auth_key,
                     "SessionKey": session_key,
@@ -179,43 +253,78 @@ class BeanfunLogin:
                 }
             )
             self.web_token = (
-                self.session.cookie_jar.filter_cookies("https://beanfun.com")
+                self.session.cookie_jar.filter_cookies(self._url("https://beanfun.com"))
                 .get("bfWebToken")
                 .value
             )
 
         return response
 
-    async def logout(self):
+    def mark_logged_in(self):
+        """Records a completed QR login and announces it on the event bus."""
+        self.is_login = True
+        self.login_at = time.time()
+        event_bus.publish(self.channel_id, SESSION_LOGIN, {"login_at": self.login_at})
+
+    async def logout(self, reason: str = "user"):
         """
         Logs out from the current session and resets the session variables.
+
+        Args:
+            reason (str, optional): Why the session ends, passed on in the logout event:
+                "user", "auto_logout", "heartbeat_lost" or "shutdown". Defaults to "user".
         """
-        # Removing login session via GET request
-        await self.session.get(
-            "https://tw.newlogin.beanfun.com/generic_handlers/remove_bflogin_session.ashx"
-        )
-        # Logging out from the service via GET request
-        await self.session.get("https://tw.beanfun.com/logout.aspx?service=999999_T0")
+        was_login = self.is_login
+        try:
+            # Removing login session via GET request
+            await self.session.get(
+                self._url(
+                    "https://tw.newlogin.beanfun.com/generic_handlers/remove_bflogin_session.ashx"
+                )
+            )
+            # Logging out from the service via GET request
+            await self.session.get(
+                self._url("https://tw.beanfun.com/logout.aspx?service=999999_T0")
+            )
 
-        # Erasing web token via POST request
-        await self.session.post(
-            "https://tw.newlogin.beanfun.com/generic_handlers/erase_token.ashx",
-            data={"web_token": "1"},
-        )  # noqa: E501
+            # Erasing web token via POST request
+            await self.session.post(
+                self._url(
+                    "https://tw.newlogin.beanfun.com/generic_handlers/erase_token.ashx"
+                ),
+                data={"web_token": "1"},
+            )  # noqa: E501
+        except BeanfunUnavailableError as e:
+            # The session is dropped locally either way, as it was on a 5xx before.
+            logger.warning("Logout of channel %s incomplete: %s", self.channel_id, e)
 
         # Resetting the session variables
         self.is_login = False
         self.login_qr_data = None
         self.web_token = None
-        self.game_account_list = None
+        self._account_cache.invalidate()
+        self._heartbeat_cache.invalidate()
+        self._secret_code = None
+        self._announced_accounts = None
+        self._stop_watching_account_list()
         self.auto_logout_sec = -1
         self.skey = None
-        if self.heartbeat_worker is not None:
-            self.heartbeat_worker.cancel()
-            self.heartbeat_worker = None
+        heartbeat_scheduler.unregister(self)
+        login_poller.unregister(self)
 
         self.session.cookie_jar.clear()
 
+        if was_login:
+            event_bus.publish(
+                self.channel_id,
+                (
+                    SESSION_HEARTBEAT_LOST
+                    if reason == "heartbeat_lost"
+                    else SESSION_LOGOUT
+                ),
+                {"reason": reason},
+            )
+
     async def get_heartbeat(self) -> HeartBeatResponse:
         """
         Checks the status of the current login periodically to maintain the login session.
@@ -229,13 +338,18 @@ class BeanfunLogin:
             self.auto_logout_sec > 0
             and time.time() - self.login_at > self.auto_logout_sec
         ):
-            await self.logout()
+            await self.logout(reason="auto_logout")
             # Return a default heartbeat response when a logout occurs.
             return HeartBeatResponse(ResultCode=0, ResultDesc="", MainAccountID="")
 
+        return await self._flight.do("heartbeat", self._fetch_heartbeat)
+
+    async def _fetch_heartbeat(self) -> HeartBeatResponse:
         # Send a POST request to check login status
         res = await self.session.get(
-            "https://tw.beanfun.com/beanfun_block/generic_handlers/echo_token.ashx?webtoken=1"
+            self._url(
+                "https://tw.beanfun.com/beanfun_block/generic_handlers/echo_token.ashx?webtoken=1"
+            )
         )
         # Parse the response text and return a HeartBeatResponse object.
         result = await res.text()
@@ -243,10 +357,35 @@ class BeanfunLogin:
         model = HeartBeatResponse(**extract_json(result, double_quotes=True))
 
         if model.ResultCode == 0:
-            await self.logout()
+            await self.logout(reason="heartbeat_lost")
+        else:
+            self._heartbeat_cache.set(model)
 
         return model
 
+    async def get_cached_heartbeat(
+        self, max_age: Optional[float] = None
+    ) -> HeartBeatResponse:
+        """
+        Returns the most recent successful heartbeat, sending a new one only if it is stale.
+
+        The heartbeat scheduler refreshes the cached result in the background, so
+        user-facing commands normally skip the echo_token.ashx round-trip.
+
+        Args:
+            max_age (float, optional): Freshness window in seconds. Defaults to HEARTBEAT_CACHE_SEC.
+
+        Returns:
+            HeartBeatResponse: Contains the status of the heartbeat operation.
+        """
+        auto_logout_due = (
+            self.auto_logout_sec > 0
+            and time.time() - self.login_at > self.auto_logout_sec
+        )
+        if not auto_logout_due and self._heartbeat_cache.is_fresh(max_age):
+            return self._heartbeat_cache.value
+        return await self.get_heartbeat()
+
     async def get_game_point(self) -> GamePointResponse:
         """
         Fetches the remaining game points.
@@ -255,84 +394,233 @@ class BeanfunLogin:
             GamePointResponse: Contains the status of the game point retrieval operation and the remaining points.
 
         """
+        return await self._flight.do("game_point", self._fetch_game_point)
+
+    async def _fetch_game_point(self) -> GamePointResponse:
         # Send a GET request to fetch remaining game points.
         res = await self.session.get(
-            "https://tw.beanfun.com/beanfun_block/generic_handlers/get_remain_point.ashx?webtoken=1"
+            self._url(
+                "https://tw.beanfun.com/beanfun_block/generic_handlers/get_remain_point.ashx?webtoken=1"
+            )
         )  # noqa: E501
         # Parse the response text and return a GamePointResponse object.
         result = await res.text()
         return GamePointResponse(**extract_json(result))
 
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Serializes what is needed to resume this login after a restart.
+
+        Returns:
+            Dict[str, Any]: JSON-serializable session state, including cookies.
+        """
+        cookies = []
+        for morsel in self.session.cookie_jar:
+            attrs = {k: v for k, v in morsel.items() if v}
+            cookies.append({"name": morsel.key, "value": morsel.value, "attrs": attrs})
+
+        accounts = None
+        if self._account_cache.has_value:
+            accounts = {
+                "fetched_at": self._account_cache.fetched_at,
+                "items": [a.model_dump() for a in self._account_cache.value],
+            }
+
+        return {
+            "channel_id": self.channel_id,
+            "is_login": self.is_login,
+            "web_token": self.web_token,
+            "login_at": self.login_at,
+            "auto_logout_sec": self.auto_logout_sec,
+            "base_url": self.base_url,
+            "cookies": cookies,
+            "accounts": accounts,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "BeanfunLogin":
+        """
+        Rebuilds a login from `export_state()` output.
+
+        The restored session is not verified here; its first heartbeat does that.
+        """
+        login = cls(
+            channel_id=state["channel_id"],
+            auto_logout_sec=state.get("auto_logout_sec", -1),
+            # States saved before base_url was stored used the configured default.
+            base_url=state.get("base_url", BEANFUN_BASE_URL),
+        )
+        login.is_login = state.get("is_login", False)
+        login.web_token = state.get("web_token")
+        login.login_at = state.get("login_at", 0)
+
+        for cookie in state.get("cookies", []):
+            morsel = SimpleCookie()
+            morsel[cookie["name"]] = cookie["value"]
+            morsel[cookie["name"]].update(cookie["attrs"])
+            domain = cookie["attrs"].get("domain", "").lstrip(".")
+            login.session.cookie_jar.update_cookies(
+                morsel, response_url=URL(f"https://{domain}/")
+            )
+
+        accounts = state.get("accounts")
+        if accounts is not None:
+            login._account_cache.set(
+                [MSAccountModel(**a) for a in accounts["items"]],
+                fetched_at=accounts["fetched_at"],
+            )
+        return login
+
+    def single_flight_stats(self) -> Dict[str, int]:
+        """
+        Returns how many reads went upstream and how many joined an in-flight request.
+
+        Returns:
+            Dict[str, int]: `executed` and `coalesced` request counts.
+        """
+        return self._flight.stats()
+
     async def close_connection(self):
         """
-        Closes the current session.
+        Closes the current session. The shared connection pool stays open.
 
         """
+        self._stop_watching_account_list()
         await self.session.close()
 
     async def heartbeat_loop(self, status_change_callback):
-        if self.heartbeat_worker is not None:
-            self.heartbeat_worker.cancel()
+        """
+        Hands the session to the shared heartbeat scheduler.
+
+        Args:
+            status_change_callback (callable): Called with a status of -1 when the session is logged out,
+                either because the heartbeat failed or the auto-logout deadline was reached.
+        """
+        heartbeat_scheduler.unregister(self)
         if not self.is_login:
             return
 
-        async def _worker(status_change_callback):
-            while True:
-                res = await self.get_heartbeat()
-                if res.ResultCode == 0:
-                    await status_change_callback(-1)
-                    break
+        heartbeat_scheduler.register(self, status_change_callback)
 
-                await asyncio.sleep(60)
+    def set_auto_logout(self, auto_logout_sec: int):
+        """
+        Sets the auto-logout timeout, counting from now if already logged in.
 
-        loop = asyncio.get_event_loop()
-        self.heartbeat_worker = loop.create_task(_worker(status_change_callback))
+        Args:
+            auto_logout_sec (int): Auto-logout timeout in seconds, -1 for no auto-logout.
+        """
+        self.auto_logout_sec = auto_logout_sec
+        if self.is_login:
+            self.login_at = time.time()
+            heartbeat_scheduler.reschedule_logout(self)
 
     async def waiting_login_loop(self, callback_func):
         """
-        This function waits for the login to complete or for a timeout.
+        Hands the pending QR login to the shared login poller and returns immediately.
 
         Args:
             callback_func (callable): The function to be called when login is complete or an error occurs.
 
-        If the login is successful, it calls the callback function with a status of 1.
-        If an error occurs, it calls the callback function with a status of -1.
-        If it times out after waiting for 120 seconds, it calls the callback function with a status of -2.
+        If the login is successful, the callback is called with a status of 1.
+        If an error occurs, the callback is called with a status of -1.
+        If LOGIN_TIME_OUT seconds pass after the QR code was created, the callback is called with a status of -2.
         """
         if self.is_login:
             await callback_func(1)
             return
-        for _ in range(120):
-            login_status = await self.get_login_status()
-            try:
-                if login_status.ResultCode == 1:
-                    self.is_login = True
-                    self.login_at = time.time()
-                    await callback_func(1)
-                    return
-                await asyncio.sleep(1)
-            except Exception:
-                await callback_func(-1)
-                return
 
-        await callback_func(-2)
-        return
+        login_poller.register(self, callback_func)
+
+    @property
+    def game_account_list(self) -> Optional[List[MSAccountModel]]:
+        """The cached game account list, or None if it has not been fetched."""
+        return self._account_cache.value
+
+    def invalidate_account_list(self):
+        """Drops the cached game account list so the next read fetches it again."""
+        self._account_cache.invalidate()
 
-    async def get_maplestory_account_list(self) -> List["MSAccountModel"]:
+    async def get_maplestory_account_list(
+        self, force_refresh: bool = False
+    ) -> List["MSAccountModel"]:
         """
         Retrieves the list of Maplestory accounts associated with the current session.
 
+        Args:
+            force_refresh (bool, optional): Ignore the cache and fetch the list. Defaults to False.
+
         Returns:
             List[MSAccountModel]: List of Maplestory accounts.
 
-        If the game account list has already been fetched, it returns the cached list.
+        The list is cached for ACCOUNT_LIST_TTL_SEC seconds. Once stale, the cached list
+        is returned immediately while it is refreshed in the background.
         """
-        if self.game_account_list is not None:
-            return self.game_account_list
+        if force_refresh:
+            self.invalidate_account_list()
+        return await self._account_cache.get(self._load_account_list)
+
+    def _load_account_list(self):
+        return self._flight.do("account_list", self._fetch_maplestory_account_list)
+
+    def search_accounts(self, query: str, limit: int = 25) -> List[MSAccountModel]:
+        """
+        Game accounts matching `query`, best and most recently used first, without I/O.
+
+        Only the cached account list is searched. If there is none yet, or it is stale,
+        it is fetched in the background and later searches see the result.
 
+        Args:
+            query (str): Text typed so far; matched by prefix, substring or fuzzily
+                against account names and ids.
+            limit (int, optional): Most results to return. Defaults to 25.
+
+        Returns:
+            List[MSAccountModel]: Matching accounts, possibly empty.
+        """
+        accounts = self._account_cache.get_nowait(self._load_account_list)
+        if not accounts:
+            return []
+        if self._account_index is None or self._account_index.accounts is not accounts:
+            self._account_index = AccountIndex(accounts)
+        return self._account_index.search(query, self._account_used, limit)
+
+    async def find_account(self, account_id: str) -> Optional[MSAccountModel]:
+        """
+        Looks up a game account by id.
+
+        A miss in a cached list refetches the list once, so accounts added on Beanfun
+        are found without waiting for the TTL.
+
+        Returns:
+            Optional[MSAccountModel]: The account, or None if it does not exist.
+        """
+        return (await self.find_accounts([account_id]))[account_id]
+
+    async def find_accounts(
+        self, account_ids: Sequence[str]
+    ) -> Dict[str, Optional[MSAccountModel]]:
+        """
+        Looks up several game accounts by id, refetching the list at most once.
+
+        Returns:
+            Dict[str, Optional[MSAccountModel]]: Each id mapped to its account, or None
+                if it does not exist.
+        """
+        from_cache = self._account_cache.has_value
+        by_id = {a.account: a for a in await self.get_maplestory_account_list()}
+        if from_cache and any(i not in by_id for i in account_ids):
+            by_id = {
+                a.account: a
+                for a in await self.get_maplestory_account_list(force_refresh=True)
+            }
+        return {i: by_id.get(i) for i in account_ids}
+
+    async def _fetch_maplestory_account_list(self) -> List["MSAccountModel"]:
         # Sending a GET request to fetch the game account list
         res = await self.session.get(
-            f"https://tw.beanfun.com/beanfun_block/auth.aspx?page_and_query=game_start.aspx%3Fservice_code_and_region%3D610074_T9&channel=game_zone&web_token={self.web_token}"  # noqa: E501
+            self._url(
+                f"https://tw.beanfun.com/beanfun_block/auth.aspx?page_and_query=game_start.aspx%3Fservice_code_and_region%3D610074_T9&channel=game_zone&web_token={self.web_token}"  # noqa: E501
+            )
         )
         response = await res.text()
 
@@ -353,20 +641,84 @@ class BeanfunLogin:
                 )
             )
 
-        # Storing the fetched game account list
-        self.game_account_list = result
-
+        self._announce_accounts(result)
         return result
 
-    async def get_account_otp(self, account: MSAccountModel) -> str:
+    def _announce_accounts(self, accounts: List[MSAccountModel]):
+        """Publishes the account list if it differs from the one announced last."""
+        pairs = [(a.account, a.account_name) for a in accounts]
+        # A fetch that finishes after logout has nothing to announce.
+        if not self.is_login or pairs == self._announced_accounts:
+            return
+        self._announced_accounts = pairs
+        event_bus.publish(
+            self.channel_id,
+            ACCOUNT_LIST_CHANGED,
+            {
+                "accounts": [
+                    {"account_name": name, "account": account}
+                    for account, name in pairs
+                ]
+            },
+        )
+
+    def _watch_account_list(self):
         """
-        Fetches the One-Time Password (OTP) for the given account.
+        Arms (on every cache update) a timer that publishes ACCOUNT_LIST_STALE once
+        the cached list goes stale. The event moves the channel's version, so an API client's ETag stops
+        matching and its next request refreshes the list.
+        """
+        self._stop_watching_account_list()
+        fetched_at = self._account_cache.fetched_at
+        if fetched_at is None or not self.is_login:
+            return
+        delay = max(0.0, fetched_at + self._account_cache.ttl - time.time())
+        self._account_stale_timer = asyncio.get_running_loop().call_later(
+            delay, self._on_account_list_timer
+        )
 
-        Args:
-            account (MSAccountModel): The account to fetch the OTP for.
+    def _stop_watching_account_list(self):
+        if self._account_stale_timer is not None:
+            self._account_stale_timer.cancel()
+            self._account_stale_timer = None
+
+    def _on_account_list_timer(self):
+        self._account_stale_timer = None
+        if self._account_cache.is_fresh():
+            # Refreshed since the timer was armed.
+            self._watch_account_list()
+        elif self.is_login and self._account_cache.has_value:
+            event_bus.publish(self.channel_id, ACCOUNT_LIST_STALE)
+
+    async def _get_secret_code(self) -> str:
+        """
+        Returns the session's SecretCode from get_cookies.ashx.
+
+        The value is bound to the login session, so it is cached until logout.
+        """
+        if self._secret_code is not None:
+            return self._secret_code
+        return await self._flight.do("secret_code", self._fetch_secret_code)
+
+    async def _fetch_secret_code(self) -> str:
+        # Getting cookies from server
+        res = await self.session.get(
+            self._url(
+                "https://tw.newlogin.beanfun.com/generic_handlers/get_cookies.ashx"
+            )
+        )  # noqa: E501
+        match = re.search(r"var m_strSecretCode = '(.+?)';", await res.text())
+        if not match:
+            raise ValueError("Failed to get SecretCode")
+        self._secret_code = match.group(1)
+        return self._secret_code
+
+    async def _start_game(self, account: MSAccountModel) -> Tuple[str, str]:
+        """
+        Opens game_start_step2 for the account.
 
         Returns:
-            str: The decrypted OTP.
+            Tuple[str, str]: The account create time string and the polling key.
         """
         d = datetime.now()
 
@@ -375,7 +727,9 @@ class BeanfunLogin:
 
         # Sending a GET request with the formatted datetime, service details, and account serial number
         res = await self.session.get(
-            f"https://tw.beanfun.com/beanfun_block/game_zone/game_start_step2.aspx?service_code=610074&service_region=T9&sotp={account.sn}&dt={str_datetime}"  # noqa: E501
+            self._url(
+                f"https://tw.beanfun.com/beanfun_block/game_zone/game_start_step2.aspx?service_code=610074&service_region=T9&sotp={account.sn}&dt={str_datetime}"  # noqa: E501
+            )
         )
 
         html = await res.text()
@@ -411,9 +765,14 @@ class BeanfunLogin:
         )
         polling_key = match.group(1) if match else None
 
+        return date_string, polling_key
+
+    async def _record_service_start(self, account: MSAccountModel, date_string: str):
         # Sending POST request to record service start
-        res = await self.session.post(
-            "https://tw.beanfun.com/beanfun_block/generic_handlers/record_service_start.ashx",
+        await self.session.post(
+            self._url(
+                "https://tw.beanfun.com/beanfun_block/generic_handlers/record_service_start.ashx"
+            ),
             data={  # noqa: E501
                 "service_code": "610074",
                 "service_region": "T9",
@@ -424,13 +783,9 @@ class BeanfunLogin:
             },
         )
 
-        # Getting cookies from server
-        res = await self.session.get(
-            "https://tw.newlogin.beanfun.com/generic_handlers/get_cookies.ashx"
-        )  # noqa: E501
-        match = re.search(r"var m_strSecretCode = '(.+?)';", await res.text())
-        secret_code = match.group(1)
-
+    async def _get_webstart_otp(
+        self, account: MSAccountModel, date_string: str, polling_key: str, secret_code: str
+    ) -> str:
         # Parameters for getting OTP
         params = {
             "sn": polling_key,
@@ -446,10 +801,89 @@ class BeanfunLogin:
 
         # Sending GET request to get OTP
         res = await self.session.get(
-            "https://tw.beanfun.com/beanfun_block/generic_handlers/get_webstart_otp.ashx",
+            self._url(
+                "https://tw.beanfun.com/beanfun_block/generic_handlers/get_webstart_otp.ashx"
+            ),
             params=params,
         )  # noqa: E501
         data = await res.text()
 
         # Decrypting and returning the OTP
         return decrypt_des_pkcs5_hex(data)
+
+    async def get_account_otp(self, account: MSAccountModel) -> str:
+        """
+        Fetches the One-Time Password (OTP) for the given account.
+
+        game_start_step2 and then record_service_start run alongside the SecretCode
+        lookup (cached per session); get_webstart_otp follows once the service start
+        is recorded. That is three serial round-trips instead of four, so about a
+        quarter less latency. The time spent in each step is kept in
+        `last_otp_timings`.
+
+        At most OTP_SESSION_CONCURRENCY of these run at once per session; the rest wait.
+
+        Args:
+            account (MSAccountModel): The account to fetch the OTP for.
+
+        Returns:
+            str: The decrypted OTP.
+        """
+        async with self._otp_slots:
+            otp = await self._get_account_otp(account)
+        self._account_used[account.account] = time.time()
+        return otp
+
+    async def _get_account_otp(self, account: MSAccountModel) -> str:
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        async def timed(name, coro):
+            step_started = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[name] = time.perf_counter() - step_started
+
+        async def start_and_record() -> Tuple[str, str]:
+            # Beanfun expects the service start recorded before the OTP request.
+            date_string, polling_key = await timed(
+                "game_start_step2", self._start_game(account)
+            )
+            await timed(
+                "record_service_start",
+                self._record_service_start(account, date_string),
+            )
+            return date_string, polling_key
+
+        # The SecretCode belongs to the login session, not to this game start.
+        secret_cached = self._secret_code is not None
+        (date_string, polling_key), secret_code = await asyncio.gather(
+            start_and_record(),
+            timed("get_cookies", self._get_secret_code()),
+        )
+
+        try:
+            otp = await timed(
+                "get_webstart_otp",
+                self._get_webstart_otp(account, date_string, polling_key, secret_code),
+            )
+        except ValueError:
+            if not secret_cached:
+                raise
+            # A stale SecretCode makes the OTP undecryptable; refresh it once.
+            self._secret_code = None
+            secret_code = await timed("get_cookies", self._get_secret_code())
+            otp = await timed(
+                "get_webstart_otp",
+                self._get_webstart_otp(account, date_string, polling_key, secret_code),
+            )
+
+        timings["total"] = time.perf_counter() - started
+        self.last_otp_timings = timings
+        logger.debug(
+            "OTP for channel %s: %s",
+            self.channel_id,
+            ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()),
+        )
+        return otp
@@ -0,0 +1,124 @@
+"""
+Central heartbeat scheduler for every logged-in BeanfunLogin.
+
+One deadline heap owns all sessions: heartbeats are spread with jitter and
+capped in concurrency against echo_token.ashx, and auto-logout deadlines
+fire at `login_at + auto_logout_sec` instead of on the next heartbeat tick.
+"""
+
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from utils.config import (
+    HEARTBEAT_INTERVAL_SEC,
+    HEARTBEAT_JITTER_SEC,
+    HEARTBEAT_MAX_CONCURRENCY,
+)
+from utils.scheduler import DeadlineScheduler
+
+logger = logging.getLogger("methods.heartbeat")
+
+StatusCallback = Callable[[int], Awaitable[None]]
+
+
+class HeartbeatScheduler:
+    def __init__(
+        self,
+        interval: float = HEARTBEAT_INTERVAL_SEC,
+        jitter: float = HEARTBEAT_JITTER_SEC,
+        max_concurrency: int = HEARTBEAT_MAX_CONCURRENCY,
+    ):
+        self._interval = interval
+        self._jitter = jitter
+        self._scheduler = DeadlineScheduler("heartbeat", max_concurrency)
+        # channel_id -> (BeanfunLogin, status_change_callback)
+        self._sessions: Dict[object, Tuple[object, StatusCallback]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def register(self, login, status_change_callback: StatusCallback):
+        """
+        Start maintaining a logged-in session.
+
+        Args:
+            login (BeanfunLogin): The session to keep alive.
+            status_change_callback (callable): Called with -1 when the session is logged out.
+        """
+        self._sessions[login.channel_id] = (login, status_change_callback)
+        # Spread the first beat over a whole interval so logins made together don't stay in phase.
+        self._scheduler.schedule(
+            (login.channel_id, "beat"),
+            time.time() + random.uniform(0, self._interval),
+            lambda: self._beat(login.channel_id),
+        )
+        self.reschedule_logout(login)
+
+    def reschedule_logout(self, login):
+        """Re-arm the auto-logout deadline after `login_at` or `auto_logout_sec` changed."""
+        key = (login.channel_id, "logout")
+        if self._sessions.get(login.channel_id, (None,))[0] is not login:
+            return
+        if login.auto_logout_sec <= 0:
+            self._scheduler.cancel(key)
+            return
+        self._scheduler.schedule(
+            key,
+            login.login_at + login.auto_logout_sec,
+            lambda: self._expire(login.channel_id),
+        )
+
+    def unregister(self, login):
+        """Stop maintaining the session. Safe to call for unregistered sessions."""
+        if self._sessions.get(login.channel_id, (None,))[0] is not login:
+            return
+        del self._sessions[login.channel_id]
+        self._scheduler.cancel((login.channel_id, "beat"))
+        self._scheduler.cancel((login.channel_id, "logout"))
+
+    def stop(self):
+        """Cancel every scheduled heartbeat and auto-logout."""
+        self._scheduler.stop()
+        self._sessions.clear()
+
+    async def _beat(self, channel_id):
+        entry = self._sessions.get(channel_id)
+        if entry is None:
+            return
+        login, callback = entry
+        try:
+            res = await login.get_heartbeat()
+        except Exception:
+            logger.exception("Heartbeat failed for channel %s", channel_id)
+        else:
+            if res.ResultCode == 0:
+                # get_heartbeat() has already logged out and unregistered the session.
+                await callback(-1)
+                return
+
+        if self._sessions.get(channel_id) is entry:
+            self._scheduler.schedule(
+                (channel_id, "beat"),
+                time.time()
+                + self._interval
+                + random.uniform(-self._jitter, self._jitter),
+                lambda: self._beat(channel_id),
+            )
+
+    async def _expire(self, channel_id):
+        entry = self._sessions.get(channel_id)
+        if entry is None:
+            return
+        login, callback = entry
+        if login.auto_logout_sec <= 0:
+            return
+        if time.time() < login.login_at + login.auto_logout_sec:
+            self.reschedule_logout(login)
+            return
+        await login.logout(reason="auto_logout")
+        await callback(-1)
+
+
+heartbeat_scheduler = HeartbeatScheduler()
@@ -0,0 +1,146 @@
+"""
+Shared poller for every pending QR login.
+
+All pending logins are polled from one DeadlineScheduler. Each login is
+polled quickly right after its QR code is shown and progressively slower
+afterwards, and times out exactly LOGIN_TIME_OUT seconds after the QR code
+was created. Completion callbacks run in their own tasks so a slow Discord
+call never holds up the other logins.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+from exceptions.beanfun_error import LoginTimeOutError
+from utils.config import (
+    LOGIN_POLL_FAST_SEC,
+    LOGIN_POLL_FAST_WINDOW_SEC,
+    LOGIN_POLL_MAX_CONCURRENCY,
+    LOGIN_POLL_SLOW_SEC,
+    LOGIN_TIME_OUT,
+)
+from utils.scheduler import DeadlineScheduler
+
+logger = logging.getLogger("methods.login_poller")
+
+LoginCallback = Callable[[int], Awaitable[None]]
+
+
+class LoginPoller:
+    def __init__(
+        self,
+        fast_interval: float = LOGIN_POLL_FAST_SEC,
+        slow_interval: float = LOGIN_POLL_SLOW_SEC,
+        fast_window: float = LOGIN_POLL_FAST_WINDOW_SEC,
+        max_concurrency: int = LOGIN_POLL_MAX_CONCURRENCY,
+    ):
+        self._fast_interval = fast_interval
+        self._slow_interval = slow_interval
+        self._fast_window = fast_window
+        self._scheduler = DeadlineScheduler("login-poll", max_concurrency)
+        # channel_id -> (BeanfunLogin, callback)
+        self._pending: Dict[object, Tuple[object, LoginCallback]] = {}
+        self._callbacks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def register(self, login, callback: LoginCallback):
+        """
+        Start polling a login whose QR code has just been created.
+
+        Args:
+            login (BeanfunLogin): The login waiting for a QR scan.
+            callback (callable): Called with 1 on success, -1 on error or -2 on timeout.
+        """
+        self._pending[login.channel_id] = (login, callback)
+        self._scheduler.schedule(
+            (login.channel_id, "poll"),
+            time.time() + self._fast_interval,
+            lambda: self._poll(login.channel_id),
+        )
+        self._scheduler.schedule(
+            (login.channel_id, "timeout"),
+            login.qr_created_at + LOGIN_TIME_OUT,
+            lambda: self._finish(login.channel_id, -2),
+        )
+
+    def unregister(self, login):
+        """Stop polling without calling the callback. Safe to call for unknown logins."""
+        if self._pending.get(login.channel_id, (None,))[0] is not login:
+            return
+        self._drop(login.channel_id)
+
+    def stop(self):
+        """Cancel every pending poll and running callback."""
+        self._scheduler.stop()
+        self._pending.clear()
+        for task in list(self._callbacks):
+            task.cancel()
+        self._callbacks.clear()
+
+    def _interval(self, elapsed: float) -> float:
+        if elapsed <= self._fast_window:
+            return self._fast_interval
+        # Ramp linearly from the fast to the slow interval over another fast window.
+        ratio = min(1.0, (elapsed - self._fast_window) / max(self._fast_window, 1e-9))
+        return self._fast_interval + ratio * (self._slow_interval - self._fast_interval)
+
+    async def _poll(self, channel_id):
+        entry = self._pending.get(channel_id)
+        if entry is None:
+            return
+        login, _ = entry
+        try:
+            status = await login.get_login_status()
+        except LoginTimeOutError:
+            await self._finish(channel_id, -2, entry)
+            return
+        except Exception:
+            logger.exception("Login status check failed for channel %s", channel_id)
+            await self._finish(channel_id, -1, entry)
+            return
+
+        if status.ResultCode == 1:
+            if self._pending.get(channel_id) is entry:
+                login.mark_logged_in()
+            await self._finish(channel_id, 1, entry)
+            return
+
+        if self._pending.get(channel_id) is not entry:
+            return
+        now = time.time()
+        next_poll = now + self._interval(now - login.qr_created_at)
+        # Past the deadline the timeout job reports the result.
+        if next_poll < login.qr_created_at + LOGIN_TIME_OUT:
+            self._scheduler.schedule(
+                (channel_id, "poll"), next_poll, lambda: self._poll(channel_id)
+            )
+
+    async def _finish(self, channel_id, status: int, entry=None):
+        current = self._pending.get(channel_id)
+        if current is None or (entry is not None and current is not entry):
+            return
+        self._drop(channel_id)
+        _, callback = current
+        task = asyncio.get_running_loop().create_task(
+            self._run_callback(channel_id, callback, status)
+        )
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    def _drop(self, channel_id):
+        del self._pending[channel_id]
+        self._scheduler.cancel((channel_id, "poll"))
+        self._scheduler.cancel((channel_id, "timeout"))
+
+    async def _run_callback(self, channel_id, callback: LoginCallback, status: int):
+        try:
+            await callback(status)
+        except Exception:
+            logger.exception("Login callback failed for channel %s", channel_id)
+
+
+login_poller = LoginPoller()
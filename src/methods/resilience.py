@@ -0,0 +1,250 @@
+"""
+Retries and circuit breaking around Beanfun endpoints.
+
+Idempotent requests that fail with a connection error, a timeout or a 5xx
+are retried with jittered exponential backoff inside a per-call deadline; a
+5xx that outlasts the retries becomes BeanfunUnavailableError.
+Retries draw from one process-wide RetryBudget, so they can never amplify an
+outage beyond a fraction of normal traffic. Each endpoint (host + path) has a
+CircuitBreaker; while it is open, calls fail fast with
+BeanfunUnavailableError instead of waiting on a dead upstream.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict
+
+import aiohttp
+from yarl import URL
+
+from exceptions.beanfun_error import BeanfunUnavailableError
+from utils.config import (
+    BEANFUN_BREAKER_FAILURES,
+    BEANFUN_BREAKER_RESET_SEC,
+    BEANFUN_MAX_ATTEMPTS,
+    BEANFUN_REQUEST_DEADLINE_SEC,
+    BEANFUN_REQUEST_TIMEOUT_SEC,
+    BEANFUN_RETRY_BUDGET_RATIO,
+    BEANFUN_RETRY_MIN_PER_SEC,
+)
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("methods.resilience")
+
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+_BACKOFF_BASE_SEC = 0.2
+_BACKOFF_CAP_SEC = 2.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryBudget:
+    """
+    Allows retries up to `ratio` of recent requests, plus `min_per_sec` as a floor.
+    """
+
+    def __init__(self, ratio: float, min_per_sec: float):
+        self._ratio = ratio
+        self._bucket = TokenBucket(min_per_sec, max(10.0, min_per_sec * 10))
+        self.retries = 0
+        self.rejected = 0
+
+    def record_request(self):
+        self._bucket.put(self._ratio)
+
+    def try_retry(self) -> bool:
+        if self._bucket.try_take():
+            self.retries += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "available": self._bucket.tokens(),
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls, then lets a single
+    trial call through after `reset_timeout` seconds (half-open).
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.retry_after() <= 0:
+            return HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def abandon(self):
+        """Forget a half-open trial whose call ended without an outcome."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self._state != CLOSED:
+            logger.warning("Circuit for %s closed", self.endpoint)
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._state == HALF_OPEN or self._failures >= self._failure_threshold:
+            if self._state != OPEN:
+                logger.warning(
+                    "Circuit for %s opened after %d failures",
+                    self.endpoint,
+                    self._failures,
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "retry_after": self.retry_after(),
+        }
+
+
+retry_budget = RetryBudget(BEANFUN_RETRY_BUDGET_RATIO, BEANFUN_RETRY_MIN_PER_SEC)
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = _breakers[endpoint] = CircuitBreaker(
+            endpoint, BEANFUN_BREAKER_FAILURES, BEANFUN_BREAKER_RESET_SEC
+        )
+    return breaker
+
+
+def breaker_states() -> Dict[str, dict]:
+    """Snapshot of every endpoint's circuit breaker."""
+    return {endpoint: b.snapshot() for endpoint, b in _breakers.items()}
+
+
+def resilience_stats() -> dict:
+    return {"retry_budget": retry_budget.stats(), "breakers": breaker_states()}
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(_BACKOFF_CAP_SEC, _BACKOFF_BASE_SEC * 2**attempt))
+
+
+async def resilient_request(
+    method: str,
+    url,
+    send: Callable[[aiohttp.ClientTimeout], Awaitable[aiohttp.ClientResponse]],
+) -> aiohttp.ClientResponse:
+    """
+    Sends a request through the endpoint's circuit breaker, retrying when safe.
+
+    Args:
+        method (str): HTTP method, only idempotent methods are retried.
+        url (str | URL): Request URL; host and path identify the endpoint.
+        send (callable): Sends one attempt with the given timeout.
+
+    Returns:
+        aiohttp.ClientResponse: The response, never a 5xx.
+
+    Raises:
+        BeanfunUnavailableError: If the endpoint's circuit breaker is open, or it
+            still answers with a 5xx once retrying is no longer allowed.
+    """
+    url = URL(url)
+    breaker = get_breaker(f"{url.host}{url.path}")
+    retryable = method.upper() in _IDEMPOTENT_METHODS
+    deadline = time.monotonic() + BEANFUN_REQUEST_DEADLINE_SEC
+    retry_budget.record_request()
+
+    # The breaker sees one outcome per call, however many attempts it took.
+    if not breaker.allow():
+        raise BeanfunUnavailableError(breaker.endpoint, breaker.retry_after())
+    recorded = False
+    try:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            timeout = aiohttp.ClientTimeout(
+                total=max(0.1, min(BEANFUN_REQUEST_TIMEOUT_SEC, remaining))
+            )
+            error = None
+            try:
+                res = await send(timeout)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            else:
+                if res.status < 500:
+                    breaker.record_success()
+                    recorded = True
+                    return res
+
+            attempt += 1
+            delay = _backoff(attempt)
+            if (
+                not retryable
+                or attempt >= BEANFUN_MAX_ATTEMPTS
+                or time.monotonic() + delay >= deadline
+                # Opened meanwhile by other calls to the same endpoint.
+                or breaker.state == OPEN
+                or not retry_budget.try_retry()
+            ):
+                breaker.record_failure()
+                recorded = True
+                if error is not None:
+                    raise error
+                # Callers would otherwise parse Beanfun's error page.
+                res.release()
+                raise BeanfunUnavailableError(
+                    breaker.endpoint, breaker.retry_after(), res.status
+                )
+
+            if error is None:
+                res.release()
+            logger.info(
+                "Retrying %s %s (attempt %d) after %s",
+                method,
+                breaker.endpoint,
+                attempt + 1,
+                repr(error) if error is not None else f"HTTP {res.status}",
+            )
+            await asyncio.sleep(delay)
+    finally:
+        if not recorded:
+            # Cancelled, or failed in a way that says nothing about the endpoint;
+            # either way a half-open trial must not stay in flight.
+            breaker.abandon()
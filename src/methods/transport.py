@@ -0,0 +1,208 @@
+"""
+Process-wide HTTP transport shared by every BeanfunLogin.
+
+A single pooled TCPConnector serves all channels, so TLS sessions and
+keep-alive connections to the Beanfun hosts are reused across channels.
+Each BeanfunLogin still owns its ClientSession and cookie jar, which keeps
+login state isolated per channel.
+
+Every outbound request also passes through a HostLimiter for its host: a
+token bucket plus a concurrency cap, with waiters served round-robin across
+channels so one busy channel cannot starve the rest.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable, Optional
+
+import aiohttp
+
+from utils.config import (
+    BEANFUN_HOST_BURST,
+    BEANFUN_HOST_MAX_CONCURRENCY,
+    BEANFUN_HOST_RATE_PER_SEC,
+    HTTP_DNS_CACHE_SEC,
+    HTTP_KEEPALIVE_SEC,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_SIZE_PER_HOST,
+)
+from utils.rate_limit import TokenBucket
+from utils.util import SSL_CTX
+
+_connector: Optional[aiohttp.TCPConnector] = None
+_limiters: Dict[str, "HostLimiter"] = {}
+
+
+class HostLimiter:
+    """Token-bucket rate limit and concurrency cap for one upstream host."""
+
+    def __init__(self, host: str, rate: float, burst: float, max_concurrency: int):
+        self.host = host
+        self._bucket = TokenBucket(rate, burst)
+        self._max_concurrency = max_concurrency
+        self._in_flight = 0
+        # channel key -> waiters, rotated round-robin on every grant
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable):
+        """Hold one request slot for `key` (usually the channel id)."""
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, key: Hashable):
+        if (
+            not self._queues
+            and self._in_flight < self._max_concurrency
+            and self._bucket.try_take()
+        ):
+            self._in_flight += 1
+            self.granted += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(fut)
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted just before the cancellation; hand the slot back.
+                self.release()
+            else:
+                self._forget(key, fut)
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.waited += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        wait_avg = self.wait_total / self.waited if self.waited else 0.0
+        return {
+            "in_flight": self._in_flight,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "granted": self.granted,
+            "waited": self.waited,
+            "wait_avg_ms": wait_avg * 1000,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+    def _dispatch(self):
+        while self._queues and self._in_flight < self._max_concurrency:
+            delay = self._bucket.time_until()
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(
+                        delay, self._on_timer
+                    )
+                return
+
+            key, queue = next(iter(self._queues.items()))
+            fut = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if fut.done():
+                # Waiter was cancelled while queued.
+                continue
+            self._bucket.try_take()
+            self._in_flight += 1
+            self.granted += 1
+            fut.set_result(None)
+
+    def _forget(self, key: Hashable, fut: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(fut)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[key]
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+def get_host_limiter(host: str) -> HostLimiter:
+    """Return the limiter for `host`, creating it with the configured limits."""
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = _limiters[host] = HostLimiter(
+            host,
+            rate=BEANFUN_HOST_RATE_PER_SEC,
+            burst=BEANFUN_HOST_BURST,
+            max_concurrency=BEANFUN_HOST_MAX_CONCURRENCY,
+        )
+    return limiter
+
+
+def set_host_limits(
+    host: str, rate: float, burst: float, max_concurrency: int
+) -> HostLimiter:
+    """Replace the limiter for `host`, e.g. to lift the limits in a benchmark."""
+    limiter = _limiters[host] = HostLimiter(host, rate, burst, max_concurrency)
+    return limiter
+
+
+def transport_stats() -> Dict[str, dict]:
+    """Per-host limiter metrics, including queue wait times."""
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
+
+
+def get_connector() -> aiohttp.TCPConnector:
+    """Return the shared connector, creating it on first use."""
+    global _connector
+    if _connector is None or _connector.closed:
+        _connector = aiohttp.TCPConnector(
+            ssl=SSL_CTX,
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_SEC,
+            use_dns_cache=True,
+            ttl_dns_cache=HTTP_DNS_CACHE_SEC,
+            enable_cleanup_closed=True,
+        )
+    return _connector
+
+
+def create_session(unsafe_cookies: bool = False) -> aiohttp.ClientSession:
+    """
+    Create a ClientSession on the shared connector with its own cookie jar.
+
+    Args:
+        unsafe_cookies (bool, optional): Accept cookies from IP address hosts. Defaults to False.
+    """
+    return aiohttp.ClientSession(
+        connector=get_connector(),
+        connector_owner=False,
+        cookie_jar=aiohttp.CookieJar(unsafe=unsafe_cookies),
+    )
+
+
+async def close_transport():
+    """Close the shared connector. Sessions must be closed separately."""
+    global _connector
+    if _connector is not None:
+        await _connector.close()
+        _connector = None
@@ -0,0 +1,399 @@
+"""
+Offline stand-in for the Beanfun endpoints used by methods/beanfun.py.
+
+Point a BeanfunLogin at it with `BeanfunLogin(channel_id, base_url=...)`
+(or BEANFUN_BASE_URL) to exercise the full QR login, heartbeat, account
+list and OTP flows without a phone or network access. Every response
+mimics the shape the client parses, and the OTP is DES encrypted the same
+way get_webstart_otp.ashx does it.
+
+    python mock_beanfun.py --port 8998 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import secrets
+import string
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+from Crypto.Cipher import DES
+
+_SESSION_COOKIE = "ASP.NET_SessionId"
+# 1x1 transparent PNG, enough for the bot to upload as the QR image.
+_QR_PNG = base64.b64encode(
+    bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+    )
+).decode()
+
+
+class MockBeanfunState:
+    """Server-side state shared by every handler of one mock app."""
+
+    def __init__(self, accounts: int, scan_after: float):
+        self.accounts = [
+            {
+                "id": f"mockacc{i:03d}",
+                "name": f"Mock Account {i}",
+                "sn": str(100000 + i),
+                "created": "2020-01-02 03:04:05",
+            }
+            for i in range(accounts)
+        ]
+        self.scan_after = scan_after
+        self.sessions: Dict[str, dict] = {}
+        self.requests: Counter = Counter()
+        self.otps: Dict[str, str] = {}
+
+    def session(self, request: web.Request) -> Tuple[str, dict]:
+        sid = request.cookies.get(_SESSION_COOKIE)
+        if sid is None or sid not in self.sessions:
+            sid = secrets.token_hex(12)
+            self.sessions[sid] = {
+                "skey": None,
+                "qr_at": None,
+                "logged_in": False,
+                "web_token": None,
+                "secret_code": secrets.token_hex(16),
+            }
+        return sid, self.sessions[sid]
+
+
+def _state(request: web.Request) -> MockBeanfunState:
+    return request.app["state"]
+
+
+def _with_session(request: web.Request, res: web.StreamResponse, sid: str):
+    if request.cookies.get(_SESSION_COOKIE) != sid:
+        res.set_cookie(_SESSION_COOKIE, sid, path="/")
+    return res
+
+
+def _encrypt_otp(otp: str) -> str:
+    key = "".join(random.choices(string.ascii_letters + string.digits, k=8))
+    padded = otp.encode()
+    padded += b"\0" * (-len(padded) % 8)
+    encrypted = DES.new(key.encode(), DES.MODE_ECB).encrypt(padded)
+    return f"1;{key}{encrypted.hex().upper()}"
+
+
+@web.middleware
+async def _fault_middleware(request: web.Request, handler):
+    """Count requests and inject the configured latency and errors."""
+    config = request.app["config"]
+    _state(request).requests[request.path] += 1
+
+    low, high = config["latency"]
+    if high > 0:
+        await asyncio.sleep(random.uniform(low, high))
+    if config["error_rate"] > 0 and random.random() < config["error_rate"]:
+        return web.Response(status=500, text="Injected error")
+    if request.path in config["fail_paths"]:
+        return web.Response(status=503, text="Injected outage")
+    return await handler(request)
+
+
+async def handle_bflogin_index(request: web.Request):
+    state = _state(request)
+    sid, session = state.session(request)
+    session["skey"] = secrets.token_hex(10)
+    res = web.HTTPFound(f"/checkin_step2.aspx?skey={session['skey']}")
+    _with_session(request, res, sid)
+    raise res
+
+
+async def handle_checkin_step2(request: web.Request):
+    return web.Response(
+        text="<html><body>checkin</body></html>", content_type="text/html"
+    )
+
+
+async def handle_checkin(request: web.Request):
+    sid, _ = _state(request).session(request)
+    res = web.Response(text="<html><body>ok</body></html>", content_type="text/html")
+    return _with_session(request, res, sid)
+
+
+async def handle_login_index(request: web.Request):
+    sid, session = _state(request).session(request)
+    session["verification_token"] = secrets.token_urlsafe(24)
+    html = (
+        "<html><body><form>"
+        '<input name="__RequestVerificationToken" type="hidden" '
+        f'value="{session["verification_token"]}" />'
+        "</form></body></html>"
+    )
+    return _with_session(
+        request, web.Response(text=html, content_type="text/html"), sid
+    )
+
+
+async def handle_init_login(request: web.Request):
+    sid, session = _state(request).session(request)
+    session["qr_at"] = time.time()
+    data = {
+        "Result": 1,
+        "ResultCode": 0,
+        "ResultMessage": "",
+        "ResultData": {
+            "QRImage": _QR_PNG,
+            "DeepLink": f"beanfunapp://Q/gameLogin/gtw/{session['skey']}",
+            "IsHK": False,
+            "IsRecaptcha": False,
+            "RecaptchaV2PublicKey": "",
+            "IsOTP": False,
+        },
+    }
+    return _with_session(request, web.json_response(data), sid)
+
+
+async def handle_check_login_status(request: web.Request):
+    state = _state(request)
+    sid, session = state.session(request)
+    scanned = (
+        session["qr_at"] is not None
+        and time.time() - session["qr_at"] >= state.scan_after
+    )
+    data = {
+        "Result": 1 if scanned else 0,
+        "ResultCode": 1 if scanned else 0,
+        "ResultMessage": "Success" if scanned else "Failed",
+    }
+    return _with_session(request, web.json_response(data), sid)
+
+
+async def handle_qr_login(request: web.Request):
+    sid, session = _state(request).session(request)
+    res = web.Response(text="ok")
+    res.set_cookie("bfSecretCode", session["secret_code"], path="/")
+    return _with_session(request, res, sid)
+
+
+async def handle_send_login(request: web.Request):
+    sid, session = _state(request).session(request)
+    session["auth_key"] = secrets.token_hex(16)
+    html = (
+        '<html><body><form action="return.aspx" method="post">'
+        f'<input type="hidden" name="AuthKey" value="{session["auth_key"]}" />'
+        f'<input type="hidden" name="SessionKey" value="{session["skey"]}" />'
+        "</form></body></html>"
+    )
+    return _with_session(
+        request, web.Response(text=html, content_type="text/html"), sid
+    )
+
+
+async def handle_return(request: web.Request):
+    sid, session = _state(request).session(request)
+    form = await request.post()
+    if form.get("AuthKey") != session.get("auth_key"):
+        return web.Response(status=400, text="Invalid AuthKey")
+    session["logged_in"] = True
+    session["web_token"] = secrets.token_hex(20)
+    res = web.Response(text="<html><body>ok</body></html>", content_type="text/html")
+    res.set_cookie("bfWebToken", session["web_token"], path="/")
+    return _with_session(request, res, sid)
+
+
+async def handle_logout(request: web.Request):
+    sid, session = _state(request).session(request)
+    session["logged_in"] = False
+    session["web_token"] = None
+    return _with_session(request, web.Response(text="ok"), sid)
+
+
+async def handle_echo_token(request: web.Request):
+    sid, session = _state(request).session(request)
+    if session["logged_in"]:
+        text = 'var theResult = {ResultCode:1,ResultDesc:"",MainAccountID:"mockmain"};'
+    else:
+        text = 'var theResult = {ResultCode:0,ResultDesc:"Token expired",MainAccountID:""};'
+    return _with_session(request, web.Response(text=text), sid)
+
+
+async def handle_remain_point(request: web.Request):
+    text = (
+        'var theResult = {"RemainPoint" : "1234", "ResultCode" : 1, "ResultDesc" : ""};'
+    )
+    return web.Response(text=text)
+
+
+async def handle_auth(request: web.Request):
+    items = "".join(
+        f'<li><div id="{a["id"]}" sn="{a["sn"]}" visible="1">{a["name"]}</div></li>'
+        for a in _state(request).accounts
+    )
+    html = (
+        '<html><body><div id="divServiceAccountList"><ul>'
+        f"{items}"
+        '<li><div id="hiddenacc" sn="999999" visible="0">Hidden</div></li>'
+        "</ul></div></body></html>"
+    )
+    return web.Response(text=html, content_type="text/html")
+
+
+async def handle_game_start_step2(request: web.Request):
+    state = _state(request)
+    sn = request.query.get("sotp")
+    account = next((a for a in state.accounts if a["sn"] == sn), None)
+    if account is None:
+        return web.Response(status=404, text="Unknown account")
+    polling_key = (
+        f"{secrets.token_hex(4)}-{secrets.token_hex(2)}-{secrets.token_hex(6)}"
+    )
+    html = (
+        "<html><head><script>"
+        f"var MyAccountData = {{ServiceAccountID:'{account['id']}',"
+        f"ServiceAccountSN:'{account['sn']}',"
+        f"ServiceAccountCreateTime:'{account['created']}'}};"
+        "var url = "
+        f'"generic_handlers/get_result.ashx?meth=GetResultByLongPolling&key={polling_key}";'
+        "</script></head><body></body></html>"
+    )
+    return web.Response(text=html, content_type="text/html")
+
+
+async def handle_record_service_start(request: web.Request):
+    return web.Response(text="1")
+
+
+async def handle_get_cookies(request: web.Request):
+    sid, session = _state(request).session(request)
+    text = f"var m_strSecretCode = '{session['secret_code']}';"
+    return _with_session(request, web.Response(text=text), sid)
+
+
+async def handle_webstart_otp(request: web.Request):
+    state = _state(request)
+    _, session = state.session(request)
+    if (
+        not session["logged_in"]
+        or request.query.get("SecretCode") != session["secret_code"]
+    ):
+        return web.Response(text="0;Invalid session")
+    otp = "".join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    state.otps[request.query.get("ServiceAccount", "")] = otp
+    return web.Response(text=_encrypt_otp(otp))
+
+
+def create_mock_app(
+    accounts: int = 3,
+    scan_after: float = 1.0,
+    latency: Tuple[float, float] = (0.0, 0.0),
+    error_rate: float = 0.0,
+    fail_paths: Optional[set] = None,
+) -> web.Application:
+    """
+    Build the mock Beanfun application.
+
+    Args:
+        accounts (int, optional): Visible game accounts per login. Defaults to 3.
+        scan_after (float, optional): Seconds after InitLogin until the QR code counts as scanned.
+        latency (Tuple[float, float], optional): Uniform random latency range added to every request.
+        error_rate (float, optional): Probability of answering any request with HTTP 500.
+        fail_paths (set, optional): Paths that always answer HTTP 503; can be changed at runtime
+            through `app["config"]["fail_paths"]`.
+    """
+    app = web.Application(middlewares=[_fault_middleware])
+    app["state"] = MockBeanfunState(accounts, scan_after)
+    app["config"] = {
+        "latency": latency,
+        "error_rate": error_rate,
+        "fail_paths": set(fail_paths or ()),
+    }
+
+    # m.beanfun.com / tw.newlogin.beanfun.com
+    app.router.add_get("/bflogin/Index", handle_bflogin_index)
+    app.router.add_get("/checkin_step2.aspx", handle_checkin_step2)
+    app.router.add_get("/checkin.aspx", handle_checkin)
+    app.router.add_get("/generic_handlers/remove_bflogin_session.ashx", handle_logout)
+    app.router.add_post("/generic_handlers/erase_token.ashx", handle_logout)
+    app.router.add_get("/generic_handlers/get_cookies.ashx", handle_get_cookies)
+
+    # login.beanfun.com
+    app.router.add_get("/Login/Index", handle_login_index)
+    app.router.add_get("/Login/InitLogin", handle_init_login)
+    app.router.add_post("/QRLogin/CheckLoginStatus", handle_check_login_status)
+    app.router.add_get("/QRLogin/QRLogin", handle_qr_login)
+    app.router.add_get("/Login/SendLogin", handle_send_login)
+
+    # tw.beanfun.com
+    app.router.add_post("/beanfun_block/bflogin/return.aspx", handle_return)
+    app.router.add_get("/logout.aspx", handle_logout)
+    app.router.add_get(
+        "/beanfun_block/generic_handlers/echo_token.ashx", handle_echo_token
+    )
+    app.router.add_get(
+        "/beanfun_block/generic_handlers/get_remain_point.ashx", handle_remain_point
+    )
+    app.router.add_get("/beanfun_block/auth.aspx", handle_auth)
+    app.router.add_get(
+        "/beanfun_block/game_zone/game_start_step2.aspx", handle_game_start_step2
+    )
+    app.router.add_post(
+        "/beanfun_block/generic_handlers/record_service_start.ashx",
+        handle_record_service_start,
+    )
+    app.router.add_get(
+        "/beanfun_block/generic_handlers/get_webstart_otp.ashx", handle_webstart_otp
+    )
+    return app
+
+
+async def start_mock_server(
+    host: str = "127.0.0.1", port: int = 0, **kwargs
+) -> Tuple[web.AppRunner, str]:
+    """
+    Start the mock server in the running loop.
+
+    Returns:
+        Tuple[web.AppRunner, str]: The runner (call `cleanup()` to stop) and the base URL.
+    """
+    runner = web.AppRunner(create_mock_app(**kwargs))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline mock Beanfun server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8998)
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument(
+        "--scan-after",
+        type=float,
+        default=3.0,
+        help="Seconds until QR counts as scanned",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Max random latency per request (s)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Probability of HTTP 500"
+    )
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    app = create_mock_app(
+        accounts=args.accounts,
+        scan_after=args.scan_after,
+        latency=(0.0, args.latency),
+        error_rate=args.error_rate,
+    )
+    print(f"Mock Beanfun server on http://{args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,27 @@
 import argparse
+import asyncio
 import json
+import random
+import time
+from collections import Counter, defaultdict
 from typing import Any
 
+import aiohttp
 import requests
 
+from bench.common import (
+    LatencyRecorder,
+    LoopLagMonitor,
+    environment,
+    histogram,
+    print_histogram,
+    print_summary,
+    write_result,
+)
+
+GUARD_HEADERS = {"X-Beanfun-Guard": "discord-beanfun"}
+LOAD_OPERATIONS = ("status", "accounts", "otp")
+
 
 def _request(
     method: str,
@@ -13,10 +31,7 @@ def _request(
     payload: dict[str, Any] | None = None,
 ) -> requests.Response:
     url = f"{base_url.rstrip('/')}{path}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "X-Beanfun-Guard": "discord-beanfun",
-    }
+    headers = {"Authorization": f"Bearer {token}", **GUARD_HEADERS}
     return requests.request(
         method=method, url=url, headers=headers, json=payload, timeout=20
     )
@@ -40,6 +55,25 @@ def do_otp(base_url: str, token: str, account: str):
     print(json.dumps(res.json(), ensure_ascii=False, indent=2))
 
 
+def do_batch(base_url: str, token: str, accounts: list[str]):
+    res = _request(
+        "POST", base_url, token, "/account/batch", payload={"accounts": accounts}
+    )
+    print(f"[POST /account/batch] {res.status_code}")
+    print(json.dumps(res.json(), ensure_ascii=False, indent=2))
+
+
+def do_events(base_url: str, token: str):
+    url = f"{base_url.rstrip('/')}/events"
+    headers = {"Authorization": f"Bearer {token}", **GUARD_HEADERS}
+    # The server sends a keepalive comment every SSE_KEEPALIVE_SEC seconds.
+    with requests.get(url, headers=headers, stream=True, timeout=(20, 60)) as res:
+        print(f"[GET /events] {res.status_code}")
+        for line in res.iter_lines(decode_unicode=True):
+            if line:
+                print(line)
+
+
 def do_interactive(base_url: str, token: str):
     while True:
         print("\nChoose action:")
@@ -65,6 +99,187 @@ def do_interactive(base_url: str, token: str):
             print("Unknown choice")
 
 
+def parse_mix(value: str) -> dict[str, float]:
+    """Parse a request mix like "status=70,accounts=25,otp=5" into weights."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in LOAD_OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {name}")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight for {name}: {weight}")
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("Request mix needs a positive weight")
+    return mix
+
+
+async def _discover_account(session: aiohttp.ClientSession, base_url: str, token):
+    """The first account visible to `token`, used as the OTP target."""
+    async with session.get(
+        f"{base_url}/account", headers={"Authorization": f"Bearer {token}"}
+    ) as res:
+        if res.status != 200:
+            return None
+        accounts = (await res.json()).get("accounts") or []
+    return accounts[0]["account"] if accounts else None
+
+
+async def run_load(
+    base_url: str,
+    tokens: list[str],
+    concurrency: int,
+    duration: float,
+    mix: dict[str, float],
+    account: str | None = None,
+    conditional: bool = False,
+) -> dict:
+    """
+    Run `concurrency` workers for `duration` seconds, each sending requests
+    picked from `mix` with one of `tokens` (worker i uses token i % len(tokens)).
+    With `conditional`, GETs send the ETag of the worker's last response as
+    If-None-Match, like a polling client that caches.
+    """
+    base_url = base_url.rstrip("/")
+    recorder = LatencyRecorder()
+    statuses: dict[str, Counter] = defaultdict(Counter)
+    received = Counter()
+    lag = LoopLagMonitor()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=20)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers=GUARD_HEADERS
+    ) as session:
+        targets = {}
+        if "otp" in mix:
+            for token in tokens:
+                targets[token] = account or await _discover_account(
+                    session, base_url, token
+                )
+                if not targets[token]:
+                    print(f"No account for token {token[:8]}..., skipping its OTPs")
+
+        def send(name: str, token: str, etag: str | None):
+            headers = {"Authorization": f"Bearer {token}"}
+            if etag:
+                headers["If-None-Match"] = etag
+            if name == "status":
+                return session.get(f"{base_url}/status", headers=headers)
+            if name == "accounts":
+                return session.get(f"{base_url}/account", headers=headers)
+            return session.post(
+                f"{base_url}/account",
+                headers=headers,
+                json={"account": targets.get(token)},
+            )
+
+        async def worker(index: int, deadline: float):
+            token = tokens[index % len(tokens)]
+            token_mix = dict(mix)
+            if "otp" in token_mix and not targets.get(token):
+                # Without a target account this token cannot request OTPs.
+                del token_mix["otp"]
+            if not token_mix:
+                return
+            names, weights = zip(*token_mix.items())
+            etags: dict[str, str] = {}
+            while time.monotonic() < deadline:
+                name = random.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    async with send(name, token, etags.get(name)) as res:
+                        received[name] += len(await res.read())
+                        status = res.status
+                        if conditional and name != "otp" and "ETag" in res.headers:
+                            etags[name] = res.headers["ETag"]
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    statuses[name][type(e).__name__] += 1
+                    recorder.record_error(name)
+                    continue
+                statuses[name][str(status)] += 1
+                if status < 400:
+                    recorder.record(name, time.perf_counter() - started)
+                else:
+                    recorder.record_error(name)
+
+        lag.start()
+        started = time.perf_counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(worker(i, deadline) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await lag.stop()
+
+    latency = recorder.summary()
+    total = sum(sum(counter.values()) for counter in statuses.values())
+    errors = sum(entry["errors"] for entry in latency.values())
+    return {
+        "benchmark": "app_server_load",
+        "environment": environment(),
+        "parameters": {
+            "base_url": base_url,
+            "tokens": len(tokens),
+            "concurrency": concurrency,
+            "duration": duration,
+            "mix": mix,
+            "conditional": conditional,
+        },
+        "elapsed_sec": elapsed,
+        "throughput": {"requests_per_sec": total / elapsed if elapsed else 0.0},
+        "error_rate": errors / total if total else 0.0,
+        "latency": latency,
+        "histograms": {
+            name: histogram(samples) for name, samples in recorder.samples.items()
+        },
+        "statuses": {name: dict(counter) for name, counter in statuses.items()},
+        "bytes_received": dict(received),
+        "client_loop_lag": lag.summary(),
+    }
+
+
+def do_load(base_url: str, tokens: list[str], args):
+    result = asyncio.run(
+        run_load(
+            base_url,
+            tokens,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            mix=args.mix,
+            account=args.account,
+            conditional=args.conditional,
+        )
+    )
+    print(
+        f"{sum(sum(s.values()) for s in result['statuses'].values())} requests "
+        f"in {result['elapsed_sec']:.1f}s, "
+        f"{result['throughput']['requests_per_sec']:.1f} req/s, "
+        f"error rate {result['error_rate'] * 100:.2f}%"
+    )
+    print_summary("Latency (successful requests)", result["latency"])
+    for name, counts in result["histograms"].items():
+        print_histogram(f"{name} latency histogram", counts)
+    print("\nStatuses")
+    for name, counter in result["statuses"].items():
+        print(f"  {name:<10} {json.dumps(counter)}")
+    print("\nBytes received")
+    for name, size in result["bytes_received"].items():
+        print(f"  {name:<10} {size}")
+
+    if args.output:
+        write_result(args.output, result)
+        print(f"Result written to {args.output}")
+
+
+def _load_tokens(args) -> list[str]:
+    tokens = list(args.token or [])
+    if args.tokens_file:
+        with open(args.tokens_file, encoding="utf-8") as f:
+            tokens.extend(line.strip() for line in f if line.strip())
+    return tokens
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Test client for discord-beanfun app HTTP server"
@@ -74,7 +289,12 @@ def build_parser() -> argparse.ArgumentParser:
         default="http://127.0.0.1:8999",
         help="HTTP server base url, e.g. http://127.0.0.1:8080",
     )
-    parser.add_argument("--token", required=True, help="API token from /register-app")
+    parser.add_argument(
+        "--token",
+        action="append",
+        help="API token from /register-app, repeat to spread load over several apps",
+    )
+    parser.add_argument("--tokens-file", help="File with one API token per line")
     parser.add_argument(
         "--interactive",
         action="store_true",
@@ -88,25 +308,70 @@ def build_parser() -> argparse.ArgumentParser:
     sub.add_parser("accounts", help="Call GET /account")
     otp = sub.add_parser("otp", help="Call POST /account")
     otp.add_argument("--account", required=True, help="Target account id")
+    batch = sub.add_parser("batch", help="Call POST /account/batch")
+    batch.add_argument(
+        "--account",
+        action="append",
+        required=True,
+        help="Target account id, repeat for several accounts",
+    )
+    sub.add_parser("events", help="Follow GET /events until interrupted")
+
+    load = sub.add_parser("load", help="Run an async load test")
+    load.add_argument(
+        "--concurrency", type=int, default=10, help="Concurrent client workers"
+    )
+    load.add_argument(
+        "--duration", type=float, default=30, help="Test duration in seconds"
+    )
+    load.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("status=70,accounts=25,otp=5"),
+        help="Request mix weights, e.g. status=70,accounts=25,otp=5",
+    )
+    load.add_argument(
+        "--account",
+        help="OTP target account id; defaults to the first account of each token",
+    )
+    load.add_argument(
+        "--conditional",
+        action="store_true",
+        help="Revalidate GETs with If-None-Match instead of fetching them in full",
+    )
+    load.add_argument("--output", help="Write the result as JSON to this path")
     return parser
 
 
 def main():
     parser = build_parser()
     args = parser.parse_args()
+    tokens = _load_tokens(args)
+    if not tokens:
+        parser.error("at least one --token or --tokens-file is required")
+    token = tokens[0]
 
     if args.interactive:
-        do_interactive(args.base_url, args.token)
+        do_interactive(args.base_url, token)
         return
 
     if args.command == "status":
-        do_status(args.base_url, args.token)
+        do_status(args.base_url, token)
         return
     if args.command == "accounts":
-        do_accounts(args.base_url, args.token)
+        do_accounts(args.base_url, token)
         return
     if args.command == "otp":
-        do_otp(args.base_url, args.token, args.account)
+        do_otp(args.base_url, token, args.account)
+        return
+    if args.command == "batch":
+        do_batch(args.base_url, token, args.account)
+        return
+    if args.command == "events":
+        do_events(args.base_url, token)
+        return
+    if args.command == "load":
+        do_load(args.base_url, tokens, args)
         return
 
     parser.print_help()
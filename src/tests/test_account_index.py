@@ -0,0 +1,104 @@
+import random
+import string
+import unittest
+
+from utils.account_index import AccountIndex
+from utils.model import MSAccountModel
+
+
+def _in_order(query, text):
+    position = 0
+    for char in query:
+        position = text.find(char, position) + 1
+        if not position:
+            return False
+    return True
+
+
+def _scan(accounts, query, last_used, limit):
+    """Reference ranking: a plain pass over every account."""
+    query = query.strip().casefold()
+    ranked = []
+    for i, a in enumerate(accounts):
+        texts = (a.account_name.casefold(), a.account.casefold())
+        if any(t.startswith(query) for t in texts):
+            tier = 0
+        elif any(query in t for t in texts):
+            tier = 1
+        elif any(_in_order(query, t) for t in texts):
+            tier = 2
+        else:
+            continue
+        ranked.append((tier, -last_used.get(a.account, 0.0), i))
+    return [accounts[i] for _, _, i in sorted(ranked)[:limit]]
+
+
+def _account(name, account):
+    return MSAccountModel(account_name=name, account=account, sn="1")
+
+
+class AccountIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.accounts = [
+            _account("MapleMain2", "m2"),
+            _account("Alt", "x1"),
+            _account("MainChar", "m1"),
+            _account("Farmer", "f"),
+        ]
+        self.index = AccountIndex(self.accounts)
+
+    def names(self, query, last_used=None, limit=25):
+        return [
+            a.account_name for a in self.index.search(query, last_used or {}, limit)
+        ]
+
+    def test_tiers(self):
+        self.assertEqual(self.names("ma"), ["MapleMain2", "MainChar"])
+        self.assertEqual(self.names("char"), ["MainChar"])
+        self.assertEqual(self.names("mp2"), ["MapleMain2"])
+        self.assertEqual(self.names("zz"), [])
+
+    def test_prefix_beats_substring(self):
+        # "ar" starts nothing but is inside MainChar and Farmer.
+        self.assertEqual(self.names("f"), ["Farmer"])
+        self.assertEqual(self.names("ar"), ["MainChar", "Farmer"])
+
+    def test_recent_use_breaks_ties(self):
+        last_used = {"m1": 200.0, "f": 100.0}
+        self.assertEqual(self.names("ma", last_used), ["MainChar", "MapleMain2"])
+        self.assertEqual(
+            self.names("", last_used),
+            ["MainChar", "Farmer", "MapleMain2", "Alt"],
+        )
+
+    def test_limit(self):
+        self.assertEqual(self.names("", limit=2), ["MapleMain2", "Alt"])
+        self.assertEqual(self.names("a", limit=1), ["Alt"])
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(0)
+        alphabet = string.ascii_letters[:8] + string.digits[:3]
+        for size in (0, 1, 30, 300):
+            accounts = [
+                _account(
+                    "".join(rng.choices(alphabet, k=rng.randint(1, 10))),
+                    f"acct{i}",
+                )
+                for i in range(size)
+            ]
+            index = AccountIndex(accounts)
+            last_used = {
+                a.account: rng.random() for a in rng.sample(accounts, size // 5)
+            }
+            for _ in range(200):
+                query = "".join(rng.choices(alphabet, k=rng.randint(0, 4)))
+                limit = rng.choice((1, 5, 25))
+                with self.subTest(size=size, query=query, limit=limit):
+                    self.assertEqual(
+                        index.search(query, last_used, limit),
+                        _scan(accounts, query, last_used, limit),
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+import importlib
+import os
+import unittest
+
+COGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cogs")
+
+
+class CogImportTest(unittest.TestCase):
+    def test_every_cog_imports(self):
+        # main.load_extensions() loads every file in cogs/, so one that fails to
+        # import keeps the bot from starting.
+        for filename in sorted(os.listdir(COGS_DIR)):
+            if filename.endswith(".py"):
+                with self.subTest(cog=filename):
+                    module = importlib.import_module(f"cogs.{filename[:-3]}")
+                    self.assertTrue(callable(getattr(module, "setup", None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+
+from api.rate_limit import ApiRateLimiter, KeyedRateLimiter, retry_after_header
+from database.token_db import TokenRecord
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _record(token_id, channel_id=1, otp_rate_per_min=None, otp_burst=None):
+    return TokenRecord(
+        (token_id, f"token-{token_id}", "app", channel_id, "channel", 9, "user")
+        + (0.0, None, 0, None, otp_rate_per_min, otp_burst)
+    )
+
+
+class ClockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("utils.rate_limit.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class KeyedRateLimiterTest(ClockTestCase):
+    def test_acquire_is_all_or_nothing(self):
+        limiter = KeyedRateLimiter()
+        roomy = ("roomy", 1.0, 5.0)
+        tight = ("tight", 1.0, 1.0)
+        self.assertEqual(limiter.acquire([roomy, tight]), 0.0)
+
+        # "tight" is empty, so "roomy" must not be charged either.
+        self.assertAlmostEqual(limiter.acquire([roomy, tight]), 1.0)
+        self.assertEqual(limiter.acquire([roomy], cost=4.0), 0.0)
+        self.assertGreater(limiter.acquire([roomy]), 0.0)
+
+    def test_acquire_refills_over_time(self):
+        limiter = KeyedRateLimiter()
+        limit = ("key", 2.0, 2.0)
+        self.assertEqual(limiter.acquire([limit], cost=2.0), 0.0)
+        self.assertAlmostEqual(limiter.acquire([limit]), 0.5)
+
+        self.clock.now += 0.5
+        self.assertEqual(limiter.acquire([limit]), 0.0)
+        self.clock.now += 60
+        self.assertEqual(limiter.acquire([limit], cost=2.0), 0.0)
+        self.assertGreater(limiter.acquire([limit]), 0.0)
+
+    def test_acquire_up_to_grants_what_every_bucket_allows(self):
+        limiter = KeyedRateLimiter()
+        wide = ("wide", 1.0, 10.0)
+        narrow = ("narrow", 0.5, 3.0)
+        self.assertEqual(limiter.acquire_up_to([wide, narrow], 5), (3, 2.0))
+        self.assertEqual(limiter.acquire_up_to([wide, narrow], 5), (0, 2.0))
+
+        self.clock.now += 2
+        self.assertEqual(limiter.acquire_up_to([wide, narrow], 1), (1, 0.0))
+        # Both buckets paid for every grant: 10 - 3 - 1 + 2 refilled.
+        self.assertEqual(limiter.acquire_up_to([wide], 20), (8, 1.0))
+
+    def test_least_recently_used_keys_are_dropped(self):
+        limiter = KeyedRateLimiter(max_keys=2)
+        for key in ("a", "b", "a", "c"):
+            limiter.acquire([(key, 0.0, 1.0)])
+        self.assertEqual(len(limiter), 2)
+        # "a" was kept and is still empty; "b" was dropped and starts full.
+        self.assertEqual(limiter.acquire([("a", 0.0, 1.0)]), float("inf"))
+        self.assertEqual(limiter.acquire([("b", 0.0, 1.0)]), 0.0)
+
+
+class ApiRateLimiterTest(ClockTestCase):
+    def limiter(self, **kwargs):
+        options = dict(
+            rate_per_sec=1.0,
+            burst=2.0,
+            otp_per_min=6.0,
+            otp_burst=3.0,
+            channel_otp_per_min=60.0,
+            channel_otp_burst=4.0,
+        )
+        options.update(kwargs)
+        return ApiRateLimiter(**options)
+
+    def test_check_request(self):
+        limiter = self.limiter()
+        record = _record(1)
+        self.assertEqual(limiter.check_request(record), 0.0)
+        self.assertEqual(limiter.check_request(record), 0.0)
+        self.assertAlmostEqual(limiter.check_request(record), 1.0)
+        self.assertEqual(limiter.limited, 1)
+
+        self.clock.now += 1
+        self.assertEqual(limiter.check_request(record), 0.0)
+        # Tokens do not share a bucket.
+        self.assertEqual(limiter.check_request(_record(2)), 0.0)
+
+    def test_check_otps_grants_part_of_a_batch(self):
+        limiter = self.limiter()
+        record = _record(1)
+        self.assertEqual(limiter.check_otps(record, 5), (3, 10.0))
+        self.assertEqual(limiter.limited, 1)
+
+        self.clock.now += 10
+        self.assertEqual(limiter.check_otps(record, 1), (1, 0.0))
+        self.assertEqual(limiter.limited, 1)
+
+    def test_channel_limit_is_shared_between_tokens(self):
+        limiter = self.limiter()
+        first, second = _record(1), _record(2)
+        self.assertEqual(limiter.check_otps(first, 3), (3, 0.0))
+        # The channel has one OTP left although the second token has three.
+        self.assertEqual(limiter.check_otps(second, 3), (1, 1.0))
+        self.assertAlmostEqual(limiter.check_otp(second), 1.0)
+        # A token in another channel is unaffected.
+        self.assertEqual(limiter.check_otp(_record(3, channel_id=2)), 0.0)
+
+    def test_per_token_otp_override(self):
+        limiter = self.limiter()
+        record = _record(1, otp_rate_per_min=30.0, otp_burst=1.0)
+        self.assertEqual(limiter.otp_limit(record), (30.0, 1.0))
+        self.assertEqual(limiter.otp_limit(_record(2)), (6.0, 3.0))
+        self.assertEqual(limiter.check_otp(record), 0.0)
+        self.assertAlmostEqual(limiter.check_otp(record), 2.0)
+
+
+class RetryAfterHeaderTest(unittest.TestCase):
+    def test_rounds_up_to_whole_seconds(self):
+        self.assertEqual(retry_after_header(0.0), "1")
+        self.assertEqual(retry_after_header(0.2), "1")
+        self.assertEqual(retry_after_header(1.0), "1")
+        self.assertEqual(retry_after_header(1.01), "2")
+        self.assertEqual(retry_after_header(59.5), "60")
+
+
+if __name__ == "__main__":
+    unittest.main()
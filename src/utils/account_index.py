@@ -0,0 +1,151 @@
+"""
+In-memory search over one session's game accounts, used by /game autocomplete.
+
+An index is built once per fetched account list, so a lookup never does I/O.
+Accounts match on name or id, best first: prefix, then substring, then fuzzy
+(the typed characters appear in order, e.g. "mp2" finds "MapleMain2"). Within
+a tier the most recently used account comes first, then Beanfun's own order.
+
+Prefixes are found by bisecting the sorted names and ids, substrings by
+bisecting their sorted inner suffixes, and fuzzy candidates are narrowed to
+accounts containing every typed character. Lower tiers are skipped once the
+better ones fill the result, so a keystroke costs time in the matches, not
+in the number of accounts.
+"""
+
+import bisect
+import heapq
+from typing import Dict, List, Mapping, Sequence, Set, Tuple
+
+from utils.model import MSAccountModel
+
+_PREFIX, _SUBSTRING, _FUZZY = 0, 1, 2
+
+
+def _is_subsequence(query: str, text: str) -> bool:
+    remaining = iter(text)
+    return all(char in remaining for char in query)
+
+
+def _sorted_pairs(pairs: List[Tuple[str, int]]) -> Tuple[List[str], List[int]]:
+    pairs.sort()
+    return [text for text, _ in pairs], [i for _, i in pairs]
+
+
+class AccountIndex:
+    def __init__(self, accounts: Sequence[MSAccountModel]):
+        # Kept so the owner can tell whether the index matches its current list.
+        self.accounts = accounts
+        self._texts: List[Tuple[str, str]] = [
+            (a.account_name.casefold(), a.account.casefold()) for a in accounts
+        ]
+        self._positions: Dict[str, int] = {}
+        for i, a in enumerate(accounts):
+            self._positions.setdefault(a.account, i)
+
+        self._starts, self._start_owners = _sorted_pairs(
+            [(text, i) for i, texts in enumerate(self._texts) for text in set(texts)]
+        )
+        # Suffixes from the second character on: a substring that is not a prefix.
+        self._suffixes, self._suffix_owners = _sorted_pairs(
+            [
+                (text[k:], i)
+                for i, texts in enumerate(self._texts)
+                for text in set(texts)
+                for k in range(1, len(text))
+            ]
+        )
+        self._chars: Dict[str, Set[int]] = {}
+        for i, texts in enumerate(self._texts):
+            for char in set("".join(texts)):
+                self._chars.setdefault(char, set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def search(
+        self,
+        query: str,
+        last_used: Mapping[str, float],
+        limit: int = 25,
+    ) -> List[MSAccountModel]:
+        """
+        Best matches for what the user has typed so far.
+
+        Args:
+            query (str): The typed text; empty matches every account.
+            last_used (Mapping[str, float]): Account id to when it was last used.
+            limit (int, optional): Most results to return. Defaults to 25,
+                Discord's cap.
+
+        Returns:
+            List[MSAccountModel]: Matching accounts, best first.
+        """
+        query = query.strip().casefold()
+        if not query:
+            return self._recent_first(last_used, limit)
+
+        tiers: Dict[int, int] = {}
+        self._collect(query, self._starts, self._start_owners, _PREFIX, tiers)
+        if len(tiers) < limit:
+            self._collect(query, self._suffixes, self._suffix_owners, _SUBSTRING, tiers)
+        if len(tiers) < limit:
+            for i in self._fuzzy_candidates(query):
+                if i not in tiers and any(
+                    _is_subsequence(query, text) for text in self._texts[i]
+                ):
+                    tiers[i] = _FUZZY
+
+        best = heapq.nsmallest(
+            limit,
+            tiers,
+            key=lambda i: (
+                tiers[i],
+                -last_used.get(self.accounts[i].account, 0.0),
+                i,
+            ),
+        )
+        return [self.accounts[i] for i in best]
+
+    @staticmethod
+    def _collect(
+        query: str,
+        keys: List[str],
+        owners: List[int],
+        tier: int,
+        tiers: Dict[int, int],
+    ):
+        """Give every account with a key starting with `query` at most `tier`."""
+        for k in range(bisect.bisect_left(keys, query), len(keys)):
+            if not keys[k].startswith(query):
+                break
+            tiers.setdefault(owners[k], tier)
+
+    def _fuzzy_candidates(self, query: str) -> Set[int]:
+        """Accounts that contain every character of `query`, in any order."""
+        sets = []
+        for char in set(query):
+            owners = self._chars.get(char)
+            if not owners:
+                return set()
+            sets.append(owners)
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def _recent_first(
+        self, last_used: Mapping[str, float], limit: int
+    ) -> List[MSAccountModel]:
+        """Every account ranks the same, so only recent use and order matter."""
+        used = sorted(
+            (-at, self._positions[account])
+            for account, at in last_used.items()
+            if account in self._positions
+        )
+        picked = [i for _, i in used[:limit]]
+        seen = set(picked)
+        for i in range(len(self.accounts)):
+            if len(picked) >= limit:
+                break
+            if i not in seen:
+                picked.append(i)
+        return [self.accounts[i] for i in picked]
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger("utils.cache")
+
+T = TypeVar("T")
+
+
+class CachedValue(Generic[T]):
+    """
+    A single cached value with a freshness TTL and stale-while-revalidate refresh.
+
+    A fresh value is returned as is. A stale value is returned immediately while
+    one background task refreshes it. Without any value the caller waits for the
+    fetch. invalidate() drops the value and discards refreshes already in flight.
+    """
+
+    def __init__(self, ttl: float, on_set: Optional[Callable[[], None]] = None):
+        self.ttl = ttl
+        # Called whenever a value is stored, e.g. to schedule work for when it expires.
+        self._on_set = on_set
+        self._value: Optional[T] = None
+        self._fetched_at: Optional[float] = None
+        self._generation = 0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def value(self) -> Optional[T]:
+        return self._value
+
+    @property
+    def fetched_at(self) -> Optional[float]:
+        return self._fetched_at
+
+    @property
+    def has_value(self) -> bool:
+        return self._fetched_at is not None
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        if self._fetched_at is None:
+            return False
+        max_age = self.ttl if max_age is None else max_age
+        return time.time() - self._fetched_at < max_age
+
+    def set(self, value: T, fetched_at: Optional[float] = None):
+        self._value = value
+        self._fetched_at = time.time() if fetched_at is None else fetched_at
+        if self._on_set is not None:
+            self._on_set()
+
+    def invalidate(self):
+        self._generation += 1
+        self._value = None
+        self._fetched_at = None
+
+    async def get(
+        self,
+        fetch: Callable[[], Awaitable[T]],
+        stale_while_revalidate: bool = True,
+    ) -> T:
+        if self.is_fresh():
+            return self._value
+        if self.has_value and stale_while_revalidate:
+            self._refresh_in_background(fetch)
+            return self._value
+        return await self._fetch(fetch)
+
+    def get_nowait(self, fetch: Callable[[], Awaitable[T]]) -> Optional[T]:
+        """
+        The current value (possibly stale, or None) without waiting. A missing
+        or stale value is fetched in the background for the next caller.
+        """
+        if not self.is_fresh():
+            self._refresh_in_background(fetch)
+        return self._value
+
+    async def _fetch(self, fetch: Callable[[], Awaitable[T]]) -> T:
+        generation = self._generation
+        value = await fetch()
+        if generation == self._generation:
+            self.set(value)
+        return value
+
+    def _refresh_in_background(self, fetch: Callable[[], Awaitable[T]]):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(
+            self._refresh(fetch)
+        )
+
+    async def _refresh(self, fetch: Callable[[], Awaitable[T]]):
+        try:
+            await self._fetch(fetch)
+        except Exception:
+            logger.exception("Background refresh failed")
+
+
+class LRUCache(Generic[T]):
+    """
+    Bounded mapping that evicts the least recently used entry once full.
+
+    Every entry carries its own expiry (time.time() based); expired entries
+    are dropped when they are looked up. None is a valid cached value, so
+    callers pass their own `default` to tell a miss apart.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: T, ttl: float):
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[T], bool]) -> int:
+        """Drop every entry whose value matches `predicate`. Returns the count."""
+        keys = [k for k, (value, _) in self._entries.items() if predicate(value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -46,4 +46,140 @@ FEAT_APP_SERVER = _feat_app_server_raw in ("1", "true")
 
 API_PORT = int(_get_config("API_PORT", 8080))
 
-DB_PATH = _get_config("DB_PATH", "./data/tokens.db")
\ No newline at end of file
+DB_PATH = _get_config("DB_PATH", "./data/tokens.db")
+
+# Read-only connections TokenDatabase keeps open next to its single writer.
+DB_READ_POOL_SIZE = int(_get_config("DB_READ_POOL_SIZE", 4))
+
+# Background cleanup of revoked and expired API tokens.
+TOKEN_RETENTION_SEC = float(_get_config("TOKEN_RETENTION_SEC", 30 * 24 * 3600))
+
+TOKEN_SWEEP_INTERVAL_SEC = float(_get_config("TOKEN_SWEEP_INTERVAL_SEC", 3600))
+
+TOKEN_SWEEP_BATCH = int(_get_config("TOKEN_SWEEP_BATCH", 500))
+
+_token_sweep_archive_raw = _get_config("TOKEN_SWEEP_ARCHIVE", "1").strip().lower()
+TOKEN_SWEEP_ARCHIVE = _token_sweep_archive_raw in ("1", "true")
+
+# API rate limits: every request per token, and OTPs per token and per channel.
+API_RATE_PER_SEC = float(_get_config("API_RATE_PER_SEC", 5))
+
+API_RATE_BURST = float(_get_config("API_RATE_BURST", 20))
+
+API_OTP_PER_MIN = float(_get_config("API_OTP_PER_MIN", 6))
+
+API_OTP_BURST = float(_get_config("API_OTP_BURST", 3))
+
+API_CHANNEL_OTP_PER_MIN = float(_get_config("API_CHANNEL_OTP_PER_MIN", 20))
+
+API_CHANNEL_OTP_BURST = float(_get_config("API_CHANNEL_OTP_BURST", 6))
+
+# Most accounts one POST /account/batch may ask for.
+API_BATCH_MAX_ACCOUNTS = int(_get_config("API_BATCH_MAX_ACCOUNTS", 10))
+
+# Background Discord notices: coalescing window and per-channel send rate.
+NOTIFY_COALESCE_SEC = float(_get_config("NOTIFY_COALESCE_SEC", 1))
+
+NOTIFY_RATE_PER_SEC = float(_get_config("NOTIFY_RATE_PER_SEC", 1))
+
+NOTIFY_BURST = float(_get_config("NOTIFY_BURST", 5))
+
+NOTIFY_MAX_PENDING = int(_get_config("NOTIFY_MAX_PENDING", 50))
+
+NOTIFY_MAX_CONCURRENCY = int(_get_config("NOTIFY_MAX_CONCURRENCY", 4))
+
+# In-process session events and the API's /events stream.
+EVENT_BUS_QUEUE_SIZE = int(_get_config("EVENT_BUS_QUEUE_SIZE", 100))
+
+EVENT_BUS_HISTORY = int(_get_config("EVENT_BUS_HISTORY", 50))
+
+SSE_KEEPALIVE_SEC = float(_get_config("SSE_KEEPALIVE_SEC", 15))
+
+SSE_MAX_STREAMS_PER_TOKEN = int(_get_config("SSE_MAX_STREAMS_PER_TOKEN", 4))
+
+# Buffered audit log of API access.
+AUDIT_DB_PATH = _get_config("AUDIT_DB_PATH", "./data/audit.db")
+
+AUDIT_BATCH_SIZE = int(_get_config("AUDIT_BATCH_SIZE", 200))
+
+AUDIT_FLUSH_SEC = float(_get_config("AUDIT_FLUSH_SEC", 2))
+
+AUDIT_MAX_BUFFER = int(_get_config("AUDIT_MAX_BUFFER", 10000))
+
+# In-memory cache of validated API tokens in front of TokenDatabase.
+TOKEN_CACHE_SIZE = int(_get_config("TOKEN_CACHE_SIZE", 1024))
+
+TOKEN_CACHE_TTL_SEC = float(_get_config("TOKEN_CACHE_TTL_SEC", 60))
+
+TOKEN_NEGATIVE_CACHE_SEC = float(_get_config("TOKEN_NEGATIVE_CACHE_SEC", 5))
+
+# Shared HTTP transport used by every BeanfunLogin.
+HTTP_POOL_SIZE = int(_get_config("HTTP_POOL_SIZE", 100))
+
+HTTP_POOL_SIZE_PER_HOST = int(_get_config("HTTP_POOL_SIZE_PER_HOST", 20))
+
+HTTP_KEEPALIVE_SEC = float(_get_config("HTTP_KEEPALIVE_SEC", 30))
+
+HTTP_DNS_CACHE_SEC = int(_get_config("HTTP_DNS_CACHE_SEC", 300))
+
+# Send every Beanfun request to this origin instead, e.g. a local stand-in server.
+BEANFUN_BASE_URL = _get_config("BEANFUN_BASE_URL", None) or None
+
+# Outbound limits applied to each Beanfun host separately.
+BEANFUN_HOST_RATE_PER_SEC = float(_get_config("BEANFUN_HOST_RATE_PER_SEC", 20))
+
+BEANFUN_HOST_BURST = float(_get_config("BEANFUN_HOST_BURST", 40))
+
+BEANFUN_HOST_MAX_CONCURRENCY = int(_get_config("BEANFUN_HOST_MAX_CONCURRENCY", 16))
+
+# Retries and circuit breaking around Beanfun endpoints.
+BEANFUN_REQUEST_TIMEOUT_SEC = float(_get_config("BEANFUN_REQUEST_TIMEOUT_SEC", 10))
+
+BEANFUN_REQUEST_DEADLINE_SEC = float(_get_config("BEANFUN_REQUEST_DEADLINE_SEC", 20))
+
+BEANFUN_MAX_ATTEMPTS = int(_get_config("BEANFUN_MAX_ATTEMPTS", 3))
+
+BEANFUN_RETRY_BUDGET_RATIO = float(_get_config("BEANFUN_RETRY_BUDGET_RATIO", 0.2))
+
+BEANFUN_RETRY_MIN_PER_SEC = float(_get_config("BEANFUN_RETRY_MIN_PER_SEC", 1))
+
+BEANFUN_BREAKER_FAILURES = int(_get_config("BEANFUN_BREAKER_FAILURES", 5))
+
+BEANFUN_BREAKER_RESET_SEC = float(_get_config("BEANFUN_BREAKER_RESET_SEC", 30))
+
+# Central heartbeat scheduler.
+HEARTBEAT_INTERVAL_SEC = float(_get_config("HEARTBEAT_INTERVAL_SEC", 60))
+
+HEARTBEAT_JITTER_SEC = float(_get_config("HEARTBEAT_JITTER_SEC", 10))
+
+HEARTBEAT_MAX_CONCURRENCY = int(_get_config("HEARTBEAT_MAX_CONCURRENCY", 8))
+
+# How long a successful heartbeat is trusted by commands and API handlers.
+HEARTBEAT_CACHE_SEC = float(_get_config("HEARTBEAT_CACHE_SEC", 90))
+
+# Shared QR login poller.
+LOGIN_POLL_FAST_SEC = float(_get_config("LOGIN_POLL_FAST_SEC", 1))
+
+LOGIN_POLL_SLOW_SEC = float(_get_config("LOGIN_POLL_SLOW_SEC", 5))
+
+LOGIN_POLL_FAST_WINDOW_SEC = float(_get_config("LOGIN_POLL_FAST_WINDOW_SEC", 30))
+
+LOGIN_POLL_MAX_CONCURRENCY = int(_get_config("LOGIN_POLL_MAX_CONCURRENCY", 16))
+
+# Game account list cache, refreshed in the background once stale.
+ACCOUNT_LIST_TTL_SEC = float(_get_config("ACCOUNT_LIST_TTL_SEC", 300))
+
+# OTP requests one Beanfun session sends at the same time.
+OTP_SESSION_CONCURRENCY = int(_get_config("OTP_SESSION_CONCURRENCY", 3))
+
+# Encrypted persistence of logged-in sessions across restarts.
+_feat_session_store_raw = _get_config("FEAT_SESSION_STORE", "0").strip().lower()
+FEAT_SESSION_STORE = _feat_session_store_raw in ("1", "true")
+
+SESSION_STORE_PATH = _get_config("SESSION_STORE_PATH", "./data/sessions.db")
+
+# Passphrase the store key is derived from (scrypt, salt kept in the store).
+# Falls back to a random key file next to SESSION_STORE_PATH when empty.
+SESSION_STORE_KEY = _get_config("SESSION_STORE_KEY", None)
+
+SESSION_RESTORE_CONCURRENCY = int(_get_config("SESSION_RESTORE_CONCURRENCY", 8))
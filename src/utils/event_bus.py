@@ -0,0 +1,146 @@
+"""
+In-process publish/subscribe of per-channel session events.
+
+BeanfunLogin publishes; the API's /events stream (and anything else in the
+process) subscribes. publish() never waits: each subscriber has a bounded
+queue, and a subscriber that falls behind gets a single "resync" event in
+place of what it missed. Every channel numbers its events from 1, and the
+last few are kept so a reconnecting client can catch up. `epoch` is random
+per process, so a (epoch, version) pair never repeats across restarts.
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from utils.config import EVENT_BUS_HISTORY, EVENT_BUS_QUEUE_SIZE
+
+logger = logging.getLogger("utils.event_bus")
+
+SESSION_LOGIN = "login"
+SESSION_LOGOUT = "logout"
+SESSION_HEARTBEAT_LOST = "heartbeat_lost"
+ACCOUNT_LIST_CHANGED = "account_list_changed"
+# The cached account list outlived its TTL; the next read refreshes it.
+ACCOUNT_LIST_STALE = "account_list_stale"
+# Not published; tells a subscriber that events were dropped or are unknown.
+RESYNC = "resync"
+
+
+class Event:
+    __slots__ = ("id", "channel_id", "type", "data", "created_at")
+
+    def __init__(self, id: int, channel_id, type: str, data: Dict[str, Any]):
+        self.id = id
+        self.channel_id = channel_id
+        self.type = type
+        self.data = data
+        self.created_at = time.time()
+
+
+class Subscription:
+    """A channel's events as they are published. Use as a context manager."""
+
+    def __init__(self, bus: "EventBus", channel_id, max_queue: int):
+        self._bus = bus
+        self.channel_id = channel_id
+        self._queue: "asyncio.Queue[Event]" = asyncio.Queue(max_queue)
+        self.dropped = 0
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+    def _deliver(self, event: Event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self._queue.qsize()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(
+                Event(event.id, self.channel_id, RESYNC, {"reason": "overflow"})
+            )
+
+    async def get(self) -> Event:
+        """Wait for the next event."""
+        return await self._queue.get()
+
+
+class EventBus:
+    def __init__(
+        self, max_queue: int = EVENT_BUS_QUEUE_SIZE, history: int = EVENT_BUS_HISTORY
+    ):
+        self._max_queue = max_queue
+        self._history_size = history
+        self._subscribers: Dict[object, Set[Subscription]] = {}
+        self._history: Dict[object, Deque[Event]] = {}
+        self._versions: Dict[object, int] = {}
+        self.epoch = secrets.token_hex(4)
+        self.published = 0
+
+    def version(self, channel_id) -> int:
+        """Id of the channel's latest event, 0 if there has been none."""
+        return self._versions.get(channel_id, 0)
+
+    def publish(self, channel_id, type: str, data: Optional[Dict[str, Any]] = None):
+        """Hand an event to every current subscriber of the channel."""
+        version = self._versions.get(channel_id, 0) + 1
+        self._versions[channel_id] = version
+        event = Event(version, channel_id, type, data or {})
+        history = self._history.get(channel_id)
+        if history is None:
+            history = self._history[channel_id] = deque(maxlen=self._history_size)
+        history.append(event)
+        self.published += 1
+        for subscription in self._subscribers.get(channel_id, ()):
+            subscription._deliver(event)
+        logger.debug("Channel %s event %d: %s", channel_id, version, type)
+        return event
+
+    def subscribe(self, channel_id) -> Subscription:
+        subscription = Subscription(self, channel_id, self._max_queue)
+        self._subscribers.setdefault(channel_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.channel_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.channel_id]
+
+    def since(self, channel_id, last_id: int) -> Optional[List[Event]]:
+        """
+        Events of the channel after `last_id`.
+
+        Returns:
+            Optional[List[Event]]: The missed events, or None if some of them are
+                no longer kept (or `last_id` is from before a restart).
+        """
+        version = self.version(channel_id)
+        if last_id > version:
+            return None
+        missed = [e for e in self._history.get(channel_id, ()) if e.id > last_id]
+        if len(missed) < version - last_id:
+            return None
+        return missed
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._versions),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+        }
+
+
+event_bus = EventBus()
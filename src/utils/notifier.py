@@ -0,0 +1,153 @@
+"""
+Background delivery of channel notices, e.g. "app X fetched an OTP" or a
+heartbeat logout.
+
+notify() only queues the text. Each channel with pending notices has one
+sender task: it waits `window` seconds so a burst becomes a single message,
+then sends within the channel's own rate (Discord allows about 5 messages
+per 5 seconds per channel), with at most `max_concurrency` sends in flight
+across all channels.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from utils.config import (
+    NOTIFY_BURST,
+    NOTIFY_COALESCE_SEC,
+    NOTIFY_MAX_CONCURRENCY,
+    NOTIFY_MAX_PENDING,
+    NOTIFY_RATE_PER_SEC,
+)
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("utils.notifier")
+
+# Discord's message length limit.
+_MAX_MESSAGE_LENGTH = 2000
+# Idle channels' buckets are pruned once more than this many exist.
+_MAX_IDLE_BUCKETS = 256
+
+
+def _pack(lines: List[str], dropped: int) -> List[str]:
+    """Join lines into as few messages as Discord's length limit allows."""
+    if dropped:
+        lines = [f"（另有 {dropped} 則通知已省略）"] + lines
+    messages: List[str] = []
+    current = ""
+    for line in lines:
+        line = line[:_MAX_MESSAGE_LENGTH]
+        if current and len(current) + 1 + len(line) > _MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        bot,
+        window: float = NOTIFY_COALESCE_SEC,
+        rate_per_sec: float = NOTIFY_RATE_PER_SEC,
+        burst: float = NOTIFY_BURST,
+        max_pending: int = NOTIFY_MAX_PENDING,
+        max_concurrency: int = NOTIFY_MAX_CONCURRENCY,
+    ):
+        self._bot = bot
+        self._window = window
+        self._rate_per_sec = rate_per_sec
+        self._burst = burst
+        self._max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[int, List[str]] = {}
+        self._dropped: Dict[int, int] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._senders: Dict[int, asyncio.Task] = {}
+        self._closing = False
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def notify(self, channel_id: int, text: str):
+        """Queue a notice for the channel. Never waits."""
+        pending = self._pending.setdefault(channel_id, [])
+        if len(pending) >= self._max_pending:
+            # Keep the newest notices; the message says how many were left out.
+            pending.pop(0)
+            self._dropped[channel_id] = self._dropped.get(channel_id, 0) + 1
+            self.dropped += 1
+        pending.append(text)
+        self.queued += 1
+        if channel_id not in self._senders:
+            self._senders[channel_id] = asyncio.get_running_loop().create_task(
+                self._run(channel_id)
+            )
+
+    async def close(self, timeout: float = 5):
+        """Send whatever is queued right away, giving up after `timeout` seconds."""
+        self._closing = True
+        senders = list(self._senders.values())
+        if not senders:
+            return
+        _, pending = await asyncio.wait(senders, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning("Dropped notices of %d channels on close", len(pending))
+
+    def _bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_IDLE_BUCKETS:
+                # A full bucket is the same as a new one, so idle channels can go.
+                for key, other in list(self._buckets.items()):
+                    if key not in self._senders and other.tokens() >= self._burst:
+                        del self._buckets[key]
+            bucket = self._buckets[channel_id] = TokenBucket(
+                self._rate_per_sec, self._burst
+            )
+        return bucket
+
+    async def _run(self, channel_id: int):
+        bucket = self._bucket(channel_id)
+        try:
+            while self._pending.get(channel_id):
+                if not self._closing:
+                    await asyncio.sleep(self._window)
+                lines = self._pending.pop(channel_id)
+                dropped = self._dropped.pop(channel_id, 0)
+                for message in _pack(lines, dropped):
+                    wait = bucket.time_until(1)
+                    if wait > 0 and not self._closing:
+                        await asyncio.sleep(wait)
+                    bucket.try_take(1)
+                    await self._send(channel_id, message)
+        finally:
+            del self._senders[channel_id]
+
+    async def _send(self, channel_id: int, message: str):
+        async with self._slots:
+            try:
+                channel = self._bot.get_channel(channel_id)
+                if channel is None:
+                    return
+                await channel.send(message)
+                self.sent += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to send notice to channel %s", channel_id)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "channels": len(self._senders),
+        }
@@ -0,0 +1,52 @@
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    Not thread-safe; meant to be used from a single event loop.
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+    def tokens(self, now: Optional[float] = None) -> float:
+        self._refill(time.monotonic() if now is None else now)
+        return self._tokens
+
+    def put(self, amount: float, now: Optional[float] = None):
+        """Add `amount` tokens, up to capacity."""
+        self._refill(time.monotonic() if now is None else now)
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def try_take(self, amount: float = 1.0, now: Optional[float] = None) -> bool:
+        """Take `amount` tokens if available. Returns whether they were taken."""
+        self._refill(time.monotonic() if now is None else now)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return True
+        return False
+
+    def time_until(self, amount: float = 1.0, now: Optional[float] = None) -> float:
+        """Seconds until `amount` tokens are available, 0 if they already are."""
+        self._refill(time.monotonic() if now is None else now)
+        missing = amount - self._tokens
+        if missing <= 0:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return missing / self.rate
@@ -0,0 +1,101 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger("utils.scheduler")
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class DeadlineScheduler:
+    """
+    Run keyed async jobs at wall-clock deadlines from a single task.
+
+    Jobs are kept in a deadline heap; scheduling a key again replaces its
+    previous job. Due jobs run as separate tasks, bounded by max_concurrency,
+    so a slow job never delays the others.
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        self._name = name
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._jobs: Dict[Hashable, Tuple[float, int, Job]] = {}
+        self._seq = itertools.count()
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def schedule(self, key: Hashable, deadline: float, job: Job):
+        """Run job at the given time.time() deadline, replacing any job for key."""
+        seq = next(self._seq)
+        self._jobs[key] = (deadline, seq, job)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        # Replaced entries stay in the heap until popped; compact when they pile up.
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [(d, s, k) for k, (d, s, _) in self._jobs.items()]
+            heapq.heapify(self._heap)
+        self._ensure_running()
+        self._wakeup.set()
+
+    def cancel(self, key: Hashable):
+        """Drop the pending job for key, if any. Running jobs are not interrupted."""
+        self._jobs.pop(key, None)
+
+    def stop(self):
+        """Cancel the scheduler task, every running job and all pending jobs."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        self._running.clear()
+        self._jobs.clear()
+        self._heap.clear()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                entry = self._jobs.get(key)
+                # Skip entries that were cancelled or replaced.
+                if entry is None or entry[1] != seq:
+                    continue
+                del self._jobs[key]
+                self._start(key, entry[2])
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, key: Hashable, job: Job):
+        task = asyncio.get_running_loop().create_task(self._guarded(key, job))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _guarded(self, key: Hashable, job: Job):
+        async with self._semaphore:
+            try:
+                await job()
+            except Exception:
+                logger.exception("%s job %r failed", self._name, key)